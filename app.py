@@ -1,14 +1,98 @@
-from flask import Flask, request, jsonify
+import time
+
+# Startup reports how long loading this module took, measured from here
+IMPORT_START = time.perf_counter()
+
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
+import base64
+import codecs
+import hashlib
+import binascii
+import csv
+import io
 import json
+import math
+import os
+import threading
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+import numpy as np
+from job_queue import JobQueue, QueueFullError
+from metrics import COUNT_BUCKETS, Metrics, SamplingProfiler, install_query_metrics
+from percentiles import PercentileIndex
+from result_cache import ResultCache, content_key
+from serialization import FastJSONProvider, RawJSON, dumps, encode, gzip_response
+from storage import DEFAULT_SQLITE_PRAGMAS, GroupCommitWriter, install_sqlite_pragmas, sqlite_engine_options
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['SECRET_KEY'] = 'medreport-secret-key-2024'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medreport.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('MEDREPORT_DATABASE_URI', 'sqlite:///medreport.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# WAL, pragmas and a tuned pool for file-backed SQLite; MEDREPORT_SQLITE_TUNING=0 restores the defaults
+app.config['SQLITE_TUNING'] = os.environ.get('MEDREPORT_SQLITE_TUNING', '1') == '1' \
+    and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///') \
+    and ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']
+app.config['SQLITE_PRAGMAS'] = DEFAULT_SQLITE_PRAGMAS
+if app.config['SQLITE_TUNING']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(pool_size=10, max_overflow=20)
+# Group commit batches single-report inserts from concurrent requests into one transaction
+app.config['GROUP_COMMIT'] = os.environ.get('MEDREPORT_GROUP_COMMIT') == '1'
+app.config['GROUP_COMMIT_WINDOW'] = 0.005
+app.config['GROUP_COMMIT_MAX_BATCH'] = 256
+app.config['MAX_BATCH_REPORTS'] = 5000
+app.config['REPORT_HISTORY_PAGE_SIZE'] = 50
+app.config['REPORT_HISTORY_MAX_PAGE_SIZE'] = 200
+app.config['EXPORT_BATCH_SIZE'] = 500
+app.config['ANALYSIS_CACHE_SIZE'] = 10000
+app.config['ANALYSIS_CACHE_TTL'] = 3600
+app.config['CSV_UPLOAD_CHUNK_SIZE'] = 500
+app.config['TREND_MAX_POINTS'] = 5000
+app.config['PERCENTILE_MIN_BAND_SIZE'] = 30
+app.config['USER_CACHE_SIZE'] = 10000
+app.config['USER_CACHE_TTL'] = 60
+app.config['JOB_WORKERS'] = 4
+app.config['JOB_QUEUE_SIZE'] = 100
+app.config['JOB_RESULT_TTL'] = 600
+app.config['JOB_RETRY_AFTER'] = 2
+app.config['ENABLE_ML'] = os.environ.get('MEDREPORT_ENABLE_ML') == '1'
+# A pickled bundle, or a directory written by `ml_trainer.py --export-compact`
+app.config['ML_MODEL_PATH'] = os.environ.get('MEDREPORT_MODEL_PATH', 'medical_model.pkl')
+app.config['ML_MODEL_MMAP'] = os.environ.get('MEDREPORT_MODEL_MMAP') or None
+# Load the model in create_app; MEDREPORT_ML_WARM_UP=0 defers it to the first ML request
+app.config['ML_WARM_UP'] = os.environ.get('MEDREPORT_ML_WARM_UP', '1') == '1'
+# The schema is created once per deployment with `flask --app app init-db`;
+# MEDREPORT_INIT_DB=1 creates it in create_app instead
+app.config['INIT_DB'] = os.environ.get('MEDREPORT_INIT_DB') == '1'
+# Seconds between background model updates from stored reports; 0 (the default) disables them.
+# Updates are labelled by the rule analyzer, since reports have no confirmed diagnosis, so they
+# teach the model to agree with the rules; a model trained on other labels is never replaced.
+# Enable it in one process only, or run `flask --app app retrain-model` from cron
+app.config['RETRAIN_INTERVAL'] = int(os.environ.get('MEDREPORT_RETRAIN_INTERVAL', '0'))
+app.config['RETRAIN_MIN_ROWS'] = 200
+app.config['RETRAIN_MAX_ROWS'] = 50000
+app.config['RETRAIN_WINDOW'] = 20000
+app.config['RETRAIN_NEW_TREES'] = 20
+app.config['RETRAIN_MAX_TREES'] = 500
+# Last report id a rejected update examined, so the same rows aren't relabelled every run
+app.config['RETRAIN_STATE_PATH'] = app.config['ML_MODEL_PATH'].rstrip('/\\') + '.retrain.json'
+# Requests sent with an X-Profile header are sampled when enabled; slow ones are dumped to PROFILE_DIR
+app.config['PROFILING'] = os.environ.get('MEDREPORT_PROFILING') == '1'
+app.config['PROFILE_INTERVAL'] = 0.005
+app.config['PROFILE_SLOW_THRESHOLD'] = 0.5
+app.config['PROFILE_DIR'] = os.environ.get('MEDREPORT_PROFILE_DIR', 'profiles')
+# Responses at least this many bytes are gzipped for clients that accept it
+app.config['GZIP_MIN_SIZE'] = int(os.environ.get('MEDREPORT_GZIP_MIN_SIZE', '1024'))
+# Level 1 still shrinks history pages about 8x for half the CPU of level 5
+app.config['GZIP_LEVEL'] = 1
+app.config['GZIP_MIMETYPES'] = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain')
 
 db = SQLAlchemy(app)
 CORS(app, origins=["http://localhost:8000"], supports_credentials=True)
@@ -18,7 +102,7 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Database Models
-class User(db.Model):
+class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -35,7 +119,14 @@ class MedicalReport(db.Model):
     test_data = db.Column(db.Text, nullable=False)
     analysis_result = db.Column(db.Text)
     recommendations = db.Column(db.Text)
+    # The full analysis response, serialized once when the report is stored
+    analysis_json = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    analyte_values = db.relationship('AnalyteValue', backref='report', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_medical_report_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     def to_dict(self):
         return {
@@ -44,16 +135,207 @@ class MedicalReport(db.Model):
             'test_data': json.loads(self.test_data),
             'analysis_result': self.analysis_result,
             'recommendations': self.recommendations,
-            'timestamp': self.timestamp.isoformat()
+            'timestamp': self.timestamp.isoformat(),
+            'analysis': json.loads(self.analysis_json) if self.analysis_json else None
         }
+    
+    def to_json(self):
+        """to_dict() as JSON text, with the stored JSON columns spliced in unparsed"""
+        return '{"id":%d,"report_name":%s,"test_data":%s,"analysis_result":%s,"recommendations":%s,"timestamp":"%s","analysis":%s}' % (
+            self.id,
+            dumps(self.report_name),
+            self.test_data,
+            dumps(self.analysis_result),
+            dumps(self.recommendations),
+            self.timestamp.isoformat(),
+            self.analysis_json or 'null'
+        )
+
+class AnalyteValue(db.Model):
+    # Numeric test values normalized out of test_data for indexed trend queries
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('medical_report.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    analyte = db.Column(db.String(100), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    
+    # Covering index: trend queries are answered from the index alone
+    __table_args__ = (
+        db.Index('ix_analyte_value_user_analyte_timestamp', 'user_id', 'analyte', 'timestamp', 'value'),
+        # Per-report lookups, such as the backfill's NOT EXISTS check
+        db.Index('ix_analyte_value_report_id', 'report_id'),
+    )
+
+class UserSummary(db.Model):
+    # Dashboard aggregates per user, updated in each report's transaction.
+    # A missing row means not yet materialized; it is built from history on first read
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+    last_report_at = db.Column(db.DateTime)
+    last_condition = db.Column(db.String(200))
+    # JSON {condition: count} and {analyte: {status: count}}
+    condition_counts = db.Column(db.Text, nullable=False, default='{}')
+    abnormality_counts = db.Column(db.Text, nullable=False, default='{}')
+    
+    def to_dict(self):
+        return {
+            'report_count': self.report_count,
+            'last_report_at': self.last_report_at.isoformat() if self.last_report_at else None,
+            'last_condition': self.last_condition,
+            'conditions': json.loads(self.condition_counts),
+            'abnormalities': json.loads(self.abnormality_counts)
+        }
+
+def normalize_analyte(test_name):
+    return test_name.strip().lower()[:100]
+
+def analyte_values(user_id, test_results, timestamp):
+    """AnalyteValue rows for every finite numeric result in a panel"""
+    values = []
+    for test_name, value in test_results.items():
+        try:
+            num_value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(num_value):
+            values.append(AnalyteValue(
+                user_id=user_id,
+                analyte=normalize_analyte(test_name),
+                value=num_value,
+                timestamp=timestamp
+            ))
+    return values
+
+def build_report(user_id, report_name, test_results, analysis):
+    """MedicalReport with its normalized analyte values, ready to add to the session"""
+    timestamp = datetime.utcnow()
+    report = MedicalReport(
+        user_id=user_id,
+        report_name=report_name,
+        test_data=json.dumps(test_results),
+        analysis_result=analysis['analysis'],
+        recommendations=analysis['recommendations'],
+        timestamp=timestamp
+    )
+    report.analyte_values = analyte_values(user_id, test_results, timestamp)
+    return report
+
+def population_percentiles(values, user):
+    """Percentile of each (analyte, value) among stored results for the user's band.
+    
+    Best effort: percentiles are context for an analysis, so a failure here
+    leaves them out instead of failing the request.
+    """
+    percentiles = {}
+    try:
+        for analyte, value in values:
+            result = percentile_index.percentile(analyte, value, user.age, user.gender)
+            if result is not None:
+                percentiles[analyte] = result
+    except Exception as e:
+        print(f"Percentile lookup failed: {e}")
+    return percentiles
+
+def index_population(values, age, gender):
+    """Add committed (analyte, value) pairs to the percentile index, best effort like the lookup"""
+    try:
+        for analyte, value in values:
+            percentile_index.add(analyte, value, age, gender)
+    except Exception as e:
+        print(f"Percentile index update failed: {e}")
+
+def parse_age(value):
+    """Age from a form field as an int, or None when it is blank or not a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def settled_last_modified(last_modified):
+    """last_modified when it is usable as a validator, else None.
+    
+    HTTP dates have one-second resolution, so a time within the current
+    second could still be followed by another change that truncates to the
+    same date (the weak-validator rule); such dates are neither sent nor
+    compared and the ETag decides instead.
+    """
+    if last_modified is None or last_modified.replace(microsecond=0) >= datetime.utcnow().replace(microsecond=0):
+        return None
+    return last_modified
+
+def is_not_modified(etag, last_modified=None):
+    """True when the request's validators show the client already has this version"""
+    if request.if_none_match:
+        # Weak comparison, so gzipped responses' weak ETags still match
+        return request.if_none_match.contains_weak(etag)
+    last_modified = settled_last_modified(last_modified)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def json_response(text, status=200):
+    """Response for JSON text that is already encoded, e.g. by encode()"""
+    return Response(text + '\n', status=status, mimetype='application/json')
+
+def conditional_response(response, etag, last_modified=None):
+    response.set_etag(etag)
+    last_modified = settled_last_modified(last_modified)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients may cache but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def encode_cursor(timestamp, report_id):
+    """Opaque keyset cursor for the (timestamp, id) history ordering"""
+    raw = f"{timestamp.isoformat()}|{report_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    timestamp, report_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(timestamp), int(report_id)
+
+class CachedUser(UserMixin):
+    """Detached snapshot of a User, safe to share between requests and threads"""
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.age = user.age
+        self.gender = user.gender
+        self.created_at = user.created_at
+        self.profile = {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'age': user.age,
+            'gender': user.gender,
+            'joined_date': user.created_at.isoformat()
+        }
+        self.etag = hashlib.sha256(json.dumps(self.profile, sort_keys=True).encode()).hexdigest()[:32]
+
+# Identity and profile snapshots by user id; other workers see changes after USER_CACHE_TTL
+user_cache = ResultCache(max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        cached = CachedUser(user)
+        user_cache.set(user_id, cached)
+    return cached
 
 # Simple Rule-Based Medical Analyzer
+Rule = namedtuple('Rule', ['key', 'low', 'high', 'low_condition', 'high_condition', 'advice'])
+
 class MedicalAnalyzer:
-    def __init__(self):
+    def __init__(self, cache_size=10000, cache_ttl=None):
         self.normal_ranges = {
             'glucose': (70, 100),
             'blood_pressure': (90, 120),
@@ -66,104 +348,256 @@ class MedicalAnalyzer:
             'wbc': (4.5, 11.0),
             'rbc': (4.5, 6.0)
         }
+        self.condition_map = {
+            'glucose': {'high': 'Pre-diabetes', 'low': 'Hypoglycemia'},
+            'blood_pressure': {'high': 'Hypertension', 'low': 'Hypotension'},
+            'systolic': {'high': 'Hypertension', 'low': 'Hypotension'},
+            'diastolic': {'high': 'Hypertension', 'low': 'Hypotension'},
+            'cholesterol': {'high': 'High Cholesterol'},
+            'bmi': {'high': 'Overweight', 'low': 'Underweight'}
+        }
+        self.recommendations = {
+            'Normal': 'Maintain your current healthy lifestyle with regular checkups.',
+            'Hypertension': 'Reduce sodium intake, exercise regularly, monitor blood pressure daily, and consult a cardiologist.',
+            'Pre-diabetes': 'Monitor carbohydrate intake, increase physical activity, and get regular blood sugar checks.',
+            'High Cholesterol': 'Reduce saturated fats, increase fiber intake, exercise regularly, and consider statins if recommended.',
+            'Overweight': 'Focus on balanced diet with portion control, regular exercise, and lifestyle changes.',
+            'Underweight': 'Increase calorie intake with nutrient-dense foods, strength training, and medical consultation.',
+            'Hypoglycemia': 'Eat regular meals, monitor blood sugar, and carry emergency glucose.',
+            'Abnormal': 'Consult with a healthcare professional for comprehensive evaluation.',
+            'Requires medical attention': 'Seek immediate medical consultation for proper diagnosis.'
+        }
+        # Most to least urgent; picks a report's primary condition independently of test order
+        self.condition_priority = {
+            condition: rank for rank, condition in enumerate((
+                'Requires medical attention', 'Hypertension', 'Hypoglycemia', 'Pre-diabetes',
+                'High Cholesterol', 'Hypotension', 'Underweight', 'Overweight', 'Abnormal', 'Normal'
+            ))
+        }
+        # Extra advice for HIGH results, checked in this order
+        self.specific_advice = {
+            'glucose': 'Limit sugar and refined carbohydrates.',
+            'blood_pressure': 'Practice stress management techniques.',
+            'cholesterol': 'Increase omega-3 fatty acids intake.',
+            'bmi': 'Aim for gradual weight loss through diet and exercise.'
+        }
+        
+        # Compile every range into a resolved rule once, then memoize test-name lookups
+        self.rules = {key: self.compile_rule(key, key) for key in self.normal_ranges}
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+        self.status_names = (None, 'LOW', 'HIGH', 'NORMAL')
+        
+        # Results are memoized by panel content; the rule version is part of every key
+        self.version = hashlib.sha256(json.dumps(
+            [self.normal_ranges, self.condition_map, self.recommendations, self.specific_advice],
+            sort_keys=True
+        ).encode()).hexdigest()[:16]
+        self.cache = ResultCache(max_size=cache_size, ttl=cache_ttl)
     
-    def analyze(self, test_results):
-        abnormalities = []
-        conditions = []
+    def compile_rule(self, range_key, test_name):
+        """Resolve range, conditions and advice for a lowercased test name"""
+        low, high = self.normal_ranges[range_key]
+        advice = next((text for key, text in self.specific_advice.items() if key in test_name), None)
+        return Rule(
+            range_key, low, high,
+            self.get_condition(test_name, 'low'),
+            self.get_condition(test_name, 'high'),
+            advice
+        )
+    
+    def _resolve(self, test_name):
+        test_name_lower = test_name.lower()
+        if test_name_lower in self.rules:
+            return self.rules[test_name_lower]
         
-        # Analyze each test
+        # Fall back to the first range whose key appears in the name
+        for range_key in self.normal_ranges:
+            if range_key in test_name_lower:
+                return self.compile_rule(range_key, test_name_lower)
+        return None
+    
+    def analyze(self, test_results):
+        key = content_key(test_results, self.version)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.evaluate(test_results)
+            self.cache.set(key, result)
+        # Callers may add keys to the result, so never hand out the cached dict itself
+        return dict(result)
+    
+    def analyze_batch(self, reports):
+        """Analyze many test_results dicts, evaluating only the uncached ones"""
+        keys = [content_key(test_results, self.version) for test_results in reports]
+        results = [self.cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            evaluated = self.evaluate_batch([reports[index] for index in missing])
+            for index, result in zip(missing, evaluated):
+                self.cache.set(keys[index], result)
+                results[index] = result
+        return [dict(result) for result in results]
+    
+    def classify(self, test_results):
+        """(test_name, value, status, rule) for each test with a rule; status is None for non-numeric values"""
+        findings = []
         for test_name, value in test_results.items():
-            test_name_lower = test_name.lower()
-            
-            # Find matching range
-            for range_key, (low, high) in self.normal_ranges.items():
-                if range_key in test_name_lower:
-                    try:
-                        num_value = float(value)
-                        if num_value < low:
-                            abnormalities.append(f"{test_name} is LOW ({value})")
-                            conditions.append(self.get_condition(test_name_lower, 'low'))
-                        elif num_value > high:
-                            abnormalities.append(f"{test_name} is HIGH ({value})")
-                            conditions.append(self.get_condition(test_name_lower, 'high'))
+            rule = self.resolve(test_name)
+            if rule is None:
+                continue
+            try:
+                num_value = float(value)
+            except (TypeError, ValueError):
+                findings.append((test_name, value, None, rule))
+                continue
+            if num_value < rule.low:
+                findings.append((test_name, value, 'LOW', rule))
+            elif num_value > rule.high:
+                findings.append((test_name, value, 'HIGH', rule))
+            else:
+                findings.append((test_name, value, 'NORMAL', rule))
+        return findings
+    
+    def evaluate(self, test_results):
+        # Classify each test against its resolved rule; strings are built afterwards
+        findings = self.classify(test_results)
+        conditions = [
+            rule.low_condition if status == 'LOW' else rule.high_condition
+            for _, _, status, rule in findings if status in ('LOW', 'HIGH')
+        ]
+        return self.build_result(findings, conditions)
+    
+    def evaluate_batch(self, reports):
+        """Evaluate many test_results dicts with one vectorized range comparison"""
+        # Reports with the same test names share a plan: which of their tests have a rule, and
+        # each one's column. Tests without a rule never reach the flat arrays below.
+        plans = {}
+        columns = {}
+        rules = []
+        unmatched = set()
+        items = []
+        cols, nums, unparsed = [], [], []
+        for test_results in reports:
+            names = tuple(test_results)
+            plan = plans.get(names)
+            if plan is None:
+                plan_cols = [columns.get(test_name) for test_name in names]
+                for position, col in enumerate(plan_cols):
+                    if col is None and names[position] not in unmatched:
+                        rule = self.resolve(names[position])
+                        if rule is None:
+                            unmatched.add(names[position])
                         else:
-                            abnormalities.append(f"{test_name} is NORMAL ({value})")
-                    except ValueError:
-                        abnormalities.append(f"{test_name}: {value} (could not analyze)")
-                    break
+                            plan_cols[position] = columns[names[position]] = len(rules)
+                            rules.append(rule)
+                positions = [position for position, col in enumerate(plan_cols) if col is not None]
+                if len(positions) < len(names):
+                    plan_cols = [plan_cols[position] for position in positions]
+                    plan = (positions, tuple([names[position] for position in positions]))
+                else:
+                    plan = (None, names)
+                plan = plans[names] = plan + (plan_cols, [rules[col] for col in plan_cols])
+            positions, plan_names, plan_cols, plan_rules = plan
+            values = list(test_results.values())
+            if positions is not None:
+                values = [values[position] for position in positions]
+            try:
+                floats = list(map(float, values))
+            except (TypeError, ValueError):
+                floats = []
+                for value in values:
+                    try:
+                        floats.append(float(value))
+                    except (TypeError, ValueError):
+                        unparsed.append(len(nums) + len(floats))
+                        floats.append(0.0)
+            nums.extend(floats)
+            cols.extend(plan_cols)
+            items.append((plan_names, values, plan_rules))
+        
+        cols = np.array(cols, dtype=np.intp)
+        nums = np.array(nums, dtype=float)
+        lows = np.array([rule.low for rule in rules], dtype=float)
+        highs = np.array([rule.high for rule in rules], dtype=float)
+        # 0 = unparsable, 1 = LOW, 2 = HIGH, 3 = NORMAL, one code per (report, test) pair
+        status = np.where(nums < lows[cols], 1, np.where(nums > highs[cols], 2, 3))
+        status[unparsed] = 0
+        labels = np.array(self.status_names, dtype=object)[status].tolist()
+        low_conditions = np.array([rule.low_condition for rule in rules], dtype=object)
+        high_conditions = np.array([rule.high_condition for rule in rules], dtype=object)
+        conditions = np.where(status == 1, low_conditions[cols],
+                              np.where(status == 2, high_conditions[cols], None)).tolist()
+        
+        # Reports with the same tests and statuses share condition, confidence and recommendations
+        summaries = {}
+        results = []
+        start = 0
+        for plan_names, values, plan_rules in items:
+            end = start + len(values)
+            report_labels = labels[start:end]
+            findings = list(zip(plan_names, values, report_labels, plan_rules))
+            key = (plan_names, tuple(report_labels))
+            summary = summaries.get(key)
+            if summary is None:
+                report_conditions = [condition for condition in conditions[start:end] if condition is not None]
+                summary = summaries[key] = self.summarize(findings, report_conditions)
+            results.append(self.build_result(findings, None, summary))
+            start = end
+        
+        return results
+    
+    def summarize(self, findings, conditions):
+        """(condition, confidence, recommendations); these depend only on the statuses and rules"""
+        specific_advice = [rule.advice for _, _, status, rule in findings if status == 'HIGH' and rule.advice]
         
         # Determine overall condition
         if not conditions:
             overall_condition = "Normal"
             confidence = 95
         else:
-            overall_condition = ", ".join(set(conditions))
+            overall_condition = ", ".join(dict.fromkeys(conditions))
             confidence = 85 - (len(conditions) * 5)
         
-        analysis = self.generate_analysis(abnormalities, overall_condition)
-        recommendations = self.generate_recommendations(overall_condition, abnormalities)
+        recommendations = self.generate_recommendations(overall_condition, specific_advice)
+        return overall_condition, max(confidence, 50), recommendations
+    
+    def build_result(self, findings, conditions, summary=None):
+        abnormalities = [
+            f"{test_name}: {value} (could not analyze)" if status is None else f"{test_name} is {status} ({value})"
+            for test_name, value, status, _ in findings
+        ]
+        abnormal_findings = [
+            text for text, (_, _, status, _) in zip(abnormalities, findings) if status != 'NORMAL'
+        ]
+        overall_condition, confidence, recommendations = summary or self.summarize(findings, conditions)
         
         return {
             'condition': overall_condition,
-            'confidence': max(confidence, 50),
+            'confidence': confidence,
             'abnormalities': abnormalities,
-            'analysis': analysis,
+            'analysis': self.generate_analysis(abnormal_findings, overall_condition),
             'recommendations': recommendations
         }
     
+    def primary_condition(self, result):
+        """The most urgent of an evaluated result's conditions"""
+        conditions = result['condition'].split(', ')
+        return min(conditions, key=lambda condition: self.condition_priority.get(condition, len(self.condition_priority)))
+    
     def get_condition(self, test_name, status):
-        condition_map = {
-            'glucose': {'high': 'Pre-diabetes', 'low': 'Hypoglycemia'},
-            'blood_pressure': {'high': 'Hypertension', 'low': 'Hypotension'},
-            'systolic': {'high': 'Hypertension', 'low': 'Hypotension'},
-            'diastolic': {'high': 'Hypertension', 'low': 'Hypotension'},
-            'cholesterol': {'high': 'High Cholesterol'},
-            'bmi': {'high': 'Overweight', 'low': 'Underweight'}
-        }
-        
-        for key, conditions in condition_map.items():
+        for key, conditions in self.condition_map.items():
             if key in test_name:
                 return conditions.get(status, 'Abnormal')
         
         return 'Requires medical attention'
     
-    def generate_analysis(self, abnormalities, condition):
-        normal_count = sum(1 for ab in abnormalities if 'NORMAL' in ab)
-        abnormal_count = len(abnormalities) - normal_count
-        
-        if abnormal_count == 0:
+    def generate_analysis(self, abnormal_findings, condition):
+        if not abnormal_findings:
             return "All test results are within normal ranges. Excellent health indicators!"
         else:
-            abnormal_list = [ab for ab in abnormalities if 'NORMAL' not in ab]
-            return f"Analysis shows {abnormal_count} abnormal finding(s): {', '.join(abnormal_list)}. Suggested condition: {condition}."
+            return f"Analysis shows {len(abnormal_findings)} abnormal finding(s): {', '.join(abnormal_findings)}. Suggested condition: {condition}."
     
-    def generate_recommendations(self, condition, abnormalities):
-        recommendations = {
-            'Normal': 'Maintain your current healthy lifestyle with regular checkups.',
-            'Hypertension': 'Reduce sodium intake, exercise regularly, monitor blood pressure daily, and consult a cardiologist.',
-            'Pre-diabetes': 'Monitor carbohydrate intake, increase physical activity, and get regular blood sugar checks.',
-            'High Cholesterol': 'Reduce saturated fats, increase fiber intake, exercise regularly, and consider statins if recommended.',
-            'Overweight': 'Focus on balanced diet with portion control, regular exercise, and lifestyle changes.',
-            'Underweight': 'Increase calorie intake with nutrient-dense foods, strength training, and medical consultation.',
-            'Hypoglycemia': 'Eat regular meals, monitor blood sugar, and carry emergency glucose.',
-            'Abnormal': 'Consult with a healthcare professional for comprehensive evaluation.',
-            'Requires medical attention': 'Seek immediate medical consultation for proper diagnosis.'
-        }
-        
-        base_recommendation = recommendations.get(condition, recommendations['Abnormal'])
-        
-        # Add specific advice
-        specific_advice = []
-        for ab in abnormalities:
-            ab_lower = ab.lower()
-            if 'glucose' in ab_lower and 'high' in ab_lower:
-                specific_advice.append('Limit sugar and refined carbohydrates.')
-            elif 'blood_pressure' in ab_lower and 'high' in ab_lower:
-                specific_advice.append('Practice stress management techniques.')
-            elif 'cholesterol' in ab_lower and 'high' in ab_lower:
-                specific_advice.append('Increase omega-3 fatty acids intake.')
-            elif 'bmi' in ab_lower and 'high' in ab_lower:
-                specific_advice.append('Aim for gradual weight loss through diet and exercise.')
+    def generate_recommendations(self, condition, specific_advice):
+        base_recommendation = self.recommendations.get(condition, self.recommendations['Abnormal'])
         
         if specific_advice:
             base_recommendation += ' Additional advice: ' + '. '.join(specific_advice)
@@ -171,7 +605,309 @@ class MedicalAnalyzer:
         return base_recommendation
 
 # Initialize analyzer
-analyzer = MedicalAnalyzer()
+analyzer = MedicalAnalyzer(
+    cache_size=app.config['ANALYSIS_CACHE_SIZE'],
+    cache_ttl=app.config['ANALYSIS_CACHE_TTL']
+)
+
+# Optional ML analysis; the model itself is shared through the process-wide registry
+ml_analyzer = None
+if app.config['ENABLE_ML']:
+    from ml_trainer import MedicalTestAnalyzer, model_registry
+    model_registry.mmap_mode = app.config['ML_MODEL_MMAP']
+    ml_analyzer = MedicalTestAnalyzer(
+        app.config['ML_MODEL_PATH'],
+        cache_size=app.config['ANALYSIS_CACHE_SIZE'],
+        cache_ttl=app.config['ANALYSIS_CACHE_TTL']
+    )
+
+# Streaming export
+EXPORT_COLUMNS = (
+    MedicalReport.id,
+    MedicalReport.report_name,
+    MedicalReport.timestamp,
+    MedicalReport.test_data,
+    MedicalReport.analysis_result,
+    MedicalReport.recommendations
+)
+
+def export_ndjson(batches):
+    for batch in batches:
+        # test_data is already JSON text, so it is spliced in without re-parsing
+        yield ''.join(
+            '{"id": %d, "report_name": %s, "timestamp": %s, "test_data": %s, "analysis_result": %s, "recommendations": %s}\n' % (
+                row.id,
+                json.dumps(row.report_name),
+                json.dumps(row.timestamp.isoformat()),
+                row.test_data,
+                json.dumps(row.analysis_result),
+                json.dumps(row.recommendations)
+            )
+            for row in batch
+        )
+
+def export_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['id', 'report_name', 'timestamp', 'test_data', 'analysis_result', 'recommendations'])
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                row.id, row.report_name, row.timestamp.isoformat(),
+                row.test_data, row.analysis_result, row.recommendations
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv')
+}
+
+# Bulk CSV upload
+CSV_META_COLUMNS = ('report_name', 'condition')
+
+def parse_csv_value(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+def stream_csv_analysis(user, rows):
+    """Analyze and store CSV panels in chunks, yielding one NDJSON result per row"""
+    chunk_size = app.config['CSV_UPLOAD_CHUNK_SIZE']
+    total = saved = 0
+    while True:
+        # Decoding and parsing happen here, after the 200 headers have gone out, so
+        # bad input is reported as a final error line like a failed save
+        try:
+            chunk = list(islice(rows, chunk_size))
+        except (UnicodeDecodeError, csv.Error) as e:
+            yield json.dumps({'success': False, 'error': f'Invalid CSV: {e}', 'rows_saved': saved}) + '\n'
+            return
+        if not chunk:
+            break
+        
+        results = []
+        items = []
+        for row in chunk:
+            total += 1
+            test_results = {
+                name: parse_csv_value(value.strip())
+                for name, value in row.items()
+                if name and name not in CSV_META_COLUMNS and value is not None and value.strip()
+            }
+            if test_results:
+                items.append((len(results), row.get('report_name') or f'CSV upload row {total}', test_results))
+                results.append({'row': total, 'success': True})
+            else:
+                results.append({'row': total, 'success': False, 'error': 'No test data provided'})
+        
+        if items:
+            with metrics.timer('medreport_analysis_seconds', analyzer='rules', call='analyze_batch'):
+                analyses = analyzer.analyze_batch([test_results for _, _, test_results in items])
+            try:
+                report_ids, _ = save_reports(user, [
+                    (report_name, test_results, analysis)
+                    for (_, report_name, test_results), analysis in zip(items, analyses)
+                ])
+            except Exception as e:
+                db.session.rollback()
+                yield json.dumps({'success': False, 'error': str(e), 'rows_saved': saved}) + '\n'
+                return
+            saved += len(report_ids)
+            for (position, _, _), report_id, analysis in zip(items, report_ids, analyses):
+                results[position].update({
+                    'report_id': report_id,
+                    'condition': analysis['condition'],
+                    'confidence': analysis['confidence']
+                })
+        
+        yield ''.join(json.dumps(result) + '\n' for result in results)
+    
+    yield json.dumps({'done': True, 'rows': total, 'saved': saved}) + '\n'
+
+# SQLite strftime formats for trend downsampling
+TREND_BUCKETS = {
+    'hour': '%Y-%m-%dT%H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m'
+}
+
+def fold_into_summary(summary, reports):
+    """Add (timestamp, test_results, condition) reports to a UserSummary"""
+    conditions = json.loads(summary.condition_counts or '{}')
+    abnormalities = json.loads(summary.abnormality_counts or '{}')
+    for timestamp, test_results, condition in reports:
+        summary.report_count = (summary.report_count or 0) + 1
+        if summary.last_report_at is None or timestamp >= summary.last_report_at:
+            summary.last_report_at = timestamp
+            summary.last_condition = condition
+        for name in condition.split(', '):
+            conditions[name] = conditions.get(name, 0) + 1
+        for _, _, status, rule in analyzer.classify(test_results):
+            if status in ('LOW', 'HIGH'):
+                counts = abnormalities.setdefault(rule.key, {})
+                counts[status] = counts.get(status, 0) + 1
+    summary.condition_counts = json.dumps(conditions)
+    summary.abnormality_counts = json.dumps(abnormalities)
+
+def update_summary(user_id, reports):
+    """Fold new reports into the user's summary; call after they are flushed, before commit"""
+    # Flushing the reports took the write lock, so this reads the latest committed row
+    summary = db.session.get(UserSummary, user_id, with_for_update=True)
+    if summary is not None:
+        fold_into_summary(summary, reports)
+
+def build_summary(user_id):
+    """Materialize a user's summary from their full history and commit it"""
+    summary = UserSummary(user_id=user_id, report_count=0)
+    db.session.add(summary)
+    try:
+        # Insert first: the write lock keeps new reports out until the scan is committed
+        db.session.flush()
+        rows = db.session.execute(
+            db.select(MedicalReport.timestamp, MedicalReport.test_data)
+            .where(MedicalReport.user_id == user_id)
+            .order_by(MedicalReport.timestamp)
+            .execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])
+        )
+        for batch in rows.partitions():
+            panels = [json.loads(test_data) for _, test_data in batch]
+            results = analyzer.evaluate_batch(panels)
+            fold_into_summary(summary, [
+                (timestamp, panel, result['condition'])
+                for (timestamp, _), panel, result in zip(batch, panels, results)
+            ])
+        db.session.commit()
+    except IntegrityError:
+        # Built concurrently by another request
+        db.session.rollback()
+        summary = db.session.get(UserSummary, user_id)
+    return summary
+
+# Population percentiles per (analyte, age/gender band), built at startup
+percentile_index = PercentileIndex(min_band_size=app.config['PERCENTILE_MIN_BAND_SIZE'])
+
+# Optional group-commit writer for single-report inserts
+group_writer = None
+if app.config['GROUP_COMMIT']:
+    group_writer = GroupCommitWriter(
+        app, db,
+        window=app.config['GROUP_COMMIT_WINDOW'],
+        max_batch=app.config['GROUP_COMMIT_MAX_BATCH']
+    )
+
+# Background analysis jobs
+job_queue = JobQueue(
+    workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_QUEUE_SIZE'],
+    result_ttl=app.config['JOB_RESULT_TTL']
+)
+
+# Instrumentation, exposed at /api/metrics
+metrics = Metrics()
+metrics.histogram('medreport_request_seconds', 'Request latency by route')
+metrics.histogram('medreport_request_db_queries', 'Database queries per request', COUNT_BUCKETS)
+metrics.histogram('medreport_request_db_seconds', 'Database time per request')
+metrics.histogram('medreport_db_query_seconds', 'Database statement latency')
+metrics.histogram('medreport_analysis_seconds', 'Analyzer and model inference latency')
+metrics.counter('medreport_profiles_dumped_total', 'Slow request profiles written to disk')
+metrics.counter('medreport_retrain_runs_total', 'Model update runs by outcome')
+
+def cache_metrics():
+    caches = {'analysis': analyzer.cache, 'users': user_cache}
+    if ml_analyzer is not None:
+        caches['ml_analysis'] = ml_analyzer.cache
+    for name, cache in caches.items():
+        stats = cache.stats()
+        labels = {'cache': name}
+        yield 'medreport_cache_hits_total', 'counter', 'Cache hits', labels, stats['hits']
+        yield 'medreport_cache_misses_total', 'counter', 'Cache misses', labels, stats['misses']
+        yield 'medreport_cache_evictions_total', 'counter', 'Cache evictions', labels, stats['evictions']
+        yield 'medreport_cache_hit_ratio', 'gauge', 'Cache hit ratio since startup', labels, stats['hit_rate']
+        yield 'medreport_cache_entries', 'gauge', 'Cached entries', labels, stats['size']
+    yield 'medreport_jobs_pending', 'gauge', 'Queued analysis jobs', {}, job_queue.stats()['pending']
+    if group_writer is not None:
+        yield 'medreport_group_commit_size', 'gauge', 'Average writes per group commit', {}, group_writer.stats()['avg_group_size']
+
+metrics.add_collector(cache_metrics)
+
+# Seconds spent in each startup phase, filled in by create_app
+startup_times = {}
+started = threading.Event()
+startup_lock = threading.Lock()
+
+def startup_metrics():
+    for phase, seconds in startup_times.items():
+        yield 'medreport_startup_seconds', 'gauge', 'Time spent in each startup phase', {'phase': phase}, round(seconds, 4)
+
+metrics.add_collector(startup_metrics)
+
+@app.before_request
+def ensure_started():
+    # `flask --app app run` and `gunicorn app:app` serve the module-level app without calling create_app
+    if not started.is_set():
+        create_app()
+
+def record_query(elapsed):
+    # Worker threads (jobs, group commit) have no request to charge the query to
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+    if app.config['PROFILING'] and request.headers.get('X-Profile'):
+        g.profiler = SamplingProfiler(interval=app.config['PROFILE_INTERVAL']).start()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed bodies are still being generated here, so their time is not included
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('medreport_request_seconds', elapsed, method=request.method, route=route, status=response.status_code)
+    metrics.observe('medreport_request_db_queries', g.db_queries, route=route)
+    metrics.observe('medreport_request_db_seconds', g.db_time, route=route)
+    response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.1f}, db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"'
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        if elapsed >= app.config['PROFILE_SLOW_THRESHOLD']:
+            name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.endpoint or 'unmatched'}.folded"
+            profiler.dump(os.path.join(app.config['PROFILE_DIR'], name))
+            metrics.inc('medreport_profiles_dumped_total')
+            response.headers['X-Profile-Dump'] = name
+    return response
+
+@app.after_request
+def compress_response(response):
+    # Registered after record_request_metrics, so it runs first and its time is counted
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200 \
+            or response.mimetype not in app.config['GZIP_MIMETYPES'] or 'Content-Encoding' in response.headers:
+        return response
+    if response.content_length is None or response.content_length < app.config['GZIP_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip']:
+        gzip_response(response, app.config['GZIP_LEVEL'])
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    # after_request is skipped when a view raises
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
 
 # Routes
 @app.route('/api/register', methods=['POST'])
@@ -189,7 +925,7 @@ def register():
             username=data['username'],
             email=data['email'],
             password=data['password'],
-            age=data.get('age'),
+            age=parse_age(data.get('age')),
             gender=data.get('gender')
         )
         
@@ -242,6 +978,80 @@ def logout():
     logout_user()
     return jsonify({'success': True, 'message': 'Logout successful'}), 200
 
+def run_analysis(user_id, report_name, test_results):
+    """Analyze a panel and store it as a MedicalReport for user_id"""
+    with metrics.timer('medreport_analysis_seconds', analyzer='rules', call='analyze'):
+        analysis = analyzer.analyze(test_results)
+    if ml_analyzer is not None:
+        with metrics.timer('medreport_analysis_seconds', analyzer='model', call='analyze'):
+            analysis['ml_prediction'] = ml_analyzer.analyze_medical_report(test_results)
+    
+    # Save to database
+    user = load_user(user_id)
+    age, gender = user.age, user.gender
+    report = build_report(user_id, report_name, test_results, analysis)
+    values = [(value.analyte, value.value) for value in report.analyte_values]
+    analysis['percentiles'] = population_percentiles(values, user)
+    # Kept in a local because the commit below expires the report's attributes
+    analysis_json = report.analysis_json = dumps(analysis)
+    
+    summary_update = [(report.timestamp, test_results, analysis['condition'])]
+    if group_writer is not None:
+        # Committed together with concurrent requests' inserts
+        report_id = group_writer.add([report], on_flush=lambda: update_summary(user_id, summary_update))[0]
+    else:
+        db.session.add(report)
+        db.session.flush()
+        report_id = report.id
+        update_summary(user_id, summary_update)
+        db.session.commit()
+    
+    # Only committed values join the population index
+    index_population(values, age, gender)
+    
+    return {'analysis': analysis, 'analysis_json': analysis_json, 'report_id': report_id}
+
+def save_reports(user, items):
+    """Store (report_name, test_results, analysis) items in one transaction.
+    
+    Returns the report ids and each stored analysis as JSON text.
+    """
+    saved = []
+    values = []
+    for report_name, test_results, analysis in items:
+        report = build_report(user.id, report_name, test_results, analysis)
+        report_values = [(value.analyte, value.value) for value in report.analyte_values]
+        analysis['percentiles'] = population_percentiles(report_values, user)
+        report.analysis_json = dumps(analysis)
+        values.extend(report_values)
+        saved.append(report)
+    
+    db.session.add_all(saved)
+    db.session.flush()
+    # Read ids and payloads before commit expires them, avoiding one refresh query per report
+    report_ids = [report.id for report in saved]
+    payloads = [report.analysis_json for report in saved]
+    update_summary(user.id, [
+        (report.timestamp, test_results, analysis['condition'])
+        for report, (_, test_results, analysis) in zip(saved, items)
+    ])
+    db.session.commit()
+    
+    index_population(values, user.age, user.gender)
+    return report_ids, payloads
+
+def run_analysis_job(user_id, report_name, test_results):
+    # Worker threads run outside any request, so they need their own app context
+    with app.app_context():
+        try:
+            result = run_analysis(user_id, report_name, test_results)
+            # Job results are kept in memory and returned through jsonify, not spliced
+            del result['analysis_json']
+            return result
+        except Exception:
+            db.session.rollback()
+            raise
+
 @app.route('/api/analyze-report', methods=['POST'])
 @login_required
 def analyze_report():
@@ -253,85 +1063,541 @@ def analyze_report():
         if not test_results:
             return jsonify({'success': False, 'error': 'No test data provided'}), 400
         
-        analysis = analyzer.analyze(test_results)
+        result = run_analysis(current_user.id, report_name, test_results)
         
-        # Save to database
-        report = MedicalReport(
-            user_id=current_user.id,
-            report_name=report_name,
-            test_data=json.dumps(test_results),
-            analysis_result=analysis['analysis'],
-            recommendations=analysis['recommendations']
-        )
+        # The analysis was serialized once for storage; the response reuses that text
+        return json_response(encode({
+            'success': True,
+            'analysis': RawJSON(result['analysis_json']),
+            'report_id': result['report_id']
+        }))
         
-        db.session.add(report)
-        db.session.commit()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analyze-report/async', methods=['POST'])
+@login_required
+def analyze_report_async():
+    try:
+        data = request.get_json()
+        test_results = data.get('test_results', {})
+        report_name = data.get('report_name', 'Medical Report')
+        
+        if not test_results:
+            return jsonify({'success': False, 'error': 'No test data provided'}), 400
+        
+        job_id = job_queue.submit(run_analysis_job, current_user.id, report_name, test_results,
+                                  owner=current_user.id)
         
         return jsonify({
             'success': True,
-            'analysis': analysis,
-            'report_id': report.id
-        }), 200
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+        
+    except QueueFullError as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = str(app.config['JOB_RETRY_AFTER'])
+        return response, 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['owner'] != current_user.id:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = {'success': True, 'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        response.update(job['result'])
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response), 200
+
+@app.route('/api/analyze-reports/batch', methods=['POST'])
+@login_required
+def analyze_reports_batch():
+    try:
+        data = request.get_json()
+        reports = data.get('reports', [])
+        
+        if not reports:
+            return jsonify({'success': False, 'error': 'No reports provided'}), 400
+        
+        if len(reports) > app.config['MAX_BATCH_REPORTS']:
+            return jsonify({'success': False, 'error': f"Batch exceeds {app.config['MAX_BATCH_REPORTS']} reports"}), 413
+        
+        for index, item in enumerate(reports):
+            if not item.get('test_results'):
+                return jsonify({'success': False, 'error': f'No test data provided for report {index}'}), 400
+        
+        with metrics.timer('medreport_analysis_seconds', analyzer='rules', call='analyze_batch'):
+            analyses = analyzer.analyze_batch([item['test_results'] for item in reports])
+        report_ids, payloads = save_reports(current_user, [
+            (item.get('report_name', 'Medical Report'), item['test_results'], analysis)
+            for item, analysis in zip(reports, analyses)
+        ])
+        
+        return json_response(encode({
+            'success': True,
+            'results': [
+                {'report_id': report_id, 'analysis': RawJSON(payload)}
+                for report_id, payload in zip(report_ids, payloads)
+            ]
+        }))
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/upload-csv', methods=['POST'])
+@login_required
+def upload_csv():
+    # A multipart upload is spooled to disk by Werkzeug; a raw text/csv body is read as it arrives
+    if request.mimetype == 'multipart/form-data':
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file provided'}), 400
+        source = request.files['file'].stream
+    else:
+        source = request.stream
+    
+    # utf-8-sig drops the byte order mark Excel writes, which would otherwise prefix the first column name
+    rows = csv.DictReader(codecs.iterdecode(source, 'utf-8-sig'))
+    response = Response(
+        stream_with_context(stream_csv_analysis(current_user._get_current_object(), rows)),
+        mimetype='application/x-ndjson'
+    )
+    return response
+
 @app.route('/api/report-history', methods=['GET'])
 @login_required
 def get_history():
     try:
-        reports = MedicalReport.query.filter_by(user_id=current_user.id)\
-            .order_by(MedicalReport.timestamp.desc()).all()
+        # Validators from one indexed aggregate; unchanged histories get a bodyless 304
+        count, last_modified = db.session.query(
+            db.func.count(MedicalReport.id), db.func.max(MedicalReport.timestamp)
+        ).filter(MedicalReport.user_id == current_user.id).one()
+        etag = hashlib.sha256(
+            f"{current_user.id}|{count}|{last_modified}|{request.query_string.decode()}".encode()
+        ).hexdigest()[:32]
+        if is_not_modified(etag, last_modified):
+            return conditional_response(Response(status=304), etag, last_modified)
+        
+        limit = request.args.get('limit', app.config['REPORT_HISTORY_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, app.config['REPORT_HISTORY_MAX_PAGE_SIZE']))
+        summary = request.args.get('fields') == 'summary'
+        
+        # Summary mode never loads the test_data/analysis_result text columns
+        if summary:
+            query = db.session.query(MedicalReport.id, MedicalReport.report_name, MedicalReport.timestamp)
+        else:
+            query = MedicalReport.query
+        query = query.filter(MedicalReport.user_id == current_user.id)
+        
+        # Incremental sync: only reports newer than the client's latest one
+        since = request.args.get('since')
+        if since:
+            try:
+                query = query.filter(MedicalReport.timestamp > datetime.fromisoformat(since))
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid since timestamp'}), 400
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                timestamp, report_id = decode_cursor(cursor)
+            except (ValueError, binascii.Error):
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+            query = query.filter(
+                tuple_(MedicalReport.timestamp, MedicalReport.id) < tuple_(timestamp, report_id)
+            )
+        
+        # Fetch one extra row to know whether another page exists
+        rows = query.order_by(MedicalReport.timestamp.desc(), MedicalReport.id.desc())\
+            .limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+        
+        if summary:
+            reports = [
+                {'id': row.id, 'report_name': row.report_name, 'timestamp': row.timestamp.isoformat()}
+                for row in rows
+            ]
+        else:
+            # Stored JSON columns go straight into the body without a parse/re-encode round trip
+            reports = [RawJSON(report.to_json()) for report in rows]
+        
+        response = json_response(encode({
+            'success': True,
+            'reports': reports,
+            'next_cursor': next_cursor
+        }))
+        return conditional_response(response, etag, last_modified), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/report-export', methods=['GET'])
+@login_required
+def export_reports():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'Unsupported export format'}), 400
+    
+    # Rows are pulled from the database in server-side batches while streaming
+    query = db.select(*EXPORT_COLUMNS)\
+        .where(MedicalReport.user_id == current_user.id)\
+        .order_by(MedicalReport.timestamp, MedicalReport.id)\
+        .execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])
+    result = db.session.execute(query)
+    
+    generate, mimetype = EXPORT_FORMATS[export_format]
+    response = Response(stream_with_context(generate(result.partitions())), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=medical-reports.{export_format}'
+    return response
+
+@app.route('/api/trends/<analyte>', methods=['GET'])
+@login_required
+def get_trend(analyte):
+    try:
+        bucket = request.args.get('bucket')
+        if bucket is not None and bucket not in TREND_BUCKETS:
+            return jsonify({'success': False, 'error': 'Unsupported bucket'}), 400
+        
+        analyte = normalize_analyte(analyte)
+        filters = [AnalyteValue.user_id == current_user.id, AnalyteValue.analyte == analyte]
+        try:
+            if request.args.get('start'):
+                filters.append(AnalyteValue.timestamp >= datetime.fromisoformat(request.args['start']))
+            if request.args.get('end'):
+                filters.append(AnalyteValue.timestamp < datetime.fromisoformat(request.args['end']))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid start or end timestamp'}), 400
+        
+        # The newest points are kept when the range has more than TREND_MAX_POINTS; one
+        # extra row shows whether anything older was cut off
+        max_points = app.config['TREND_MAX_POINTS']
+        if bucket is None:
+            rows = db.session.query(AnalyteValue.timestamp, AnalyteValue.value)\
+                .filter(*filters).order_by(AnalyteValue.timestamp.desc())\
+                .limit(max_points + 1).all()
+            truncated = len(rows) > max_points
+            rows = rows[:max_points][::-1]
+            points = [{'timestamp': row.timestamp.isoformat(), 'value': row.value} for row in rows]
+        else:
+            # Downsample in SQL: one min/max/avg row per period
+            period = db.func.strftime(TREND_BUCKETS[bucket], AnalyteValue.timestamp).label('period')
+            rows = db.session.query(
+                period,
+                db.func.min(AnalyteValue.value).label('min'),
+                db.func.max(AnalyteValue.value).label('max'),
+                db.func.avg(AnalyteValue.value).label('avg'),
+                db.func.count(AnalyteValue.value).label('count')
+            ).filter(*filters).group_by(period).order_by(period.desc())\
+                .limit(max_points + 1).all()
+            truncated = len(rows) > max_points
+            rows = rows[:max_points][::-1]
+            points = [
+                {'period': row.period, 'min': row.min, 'max': row.max, 'avg': row.avg, 'count': row.count}
+                for row in rows
+            ]
         
         return jsonify({
             'success': True,
-            'reports': [report.to_dict() for report in reports]
+            'analyte': analyte,
+            'bucket': bucket,
+            'points': points,
+            'truncated': truncated
         }), 200
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/dashboard-summary', methods=['GET'])
+@login_required
+def get_dashboard_summary():
+    try:
+        summary = db.session.get(UserSummary, current_user.id)
+        if summary is None:
+            summary = build_summary(current_user.id)
+        
+        # Hashed like the history ETag; the raw timestamp has a space, which ETags can't contain
+        etag = hashlib.sha256(
+            f"summary|{current_user.id}|{summary.report_count}|{summary.last_report_at}".encode()
+        ).hexdigest()[:32]
+        if is_not_modified(etag):
+            return conditional_response(Response(status=304), etag)
+        return conditional_response(jsonify({'success': True, 'summary': summary.to_dict()}), etag)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/user-profile', methods=['GET'])
 @login_required
 def get_profile():
     user = current_user
-    return jsonify({
-        'success': True,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'age': user.age,
-            'gender': user.gender,
-            'joined_date': user.created_at.isoformat()
-        }
-    })
+    # Unchanged profiles are answered from the cached ETag without serializing anything
+    if is_not_modified(user.etag):
+        return conditional_response(Response(status=304), user.etag)
+    return conditional_response(jsonify({'success': True, 'user': user.profile}), user.etag)
 
 @app.route('/api/update-profile', methods=['POST'])
 @login_required
 def update_profile():
     try:
         data = request.get_json()
-        user = current_user
+        # current_user is a cached snapshot, so update the database row itself
+        user = db.session.get(User, current_user.id)
         
-        user.age = data.get('age', user.age)
+        if 'age' in data:
+            user.age = parse_age(data['age'])
         user.gender = data.get('gender', user.gender)
         
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         return jsonify({'success': True, 'message': 'Profile updated'})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    stats = {'analysis': analyzer.cache.stats(), 'users': user_cache.stats()}
+    if ml_analyzer is not None:
+        stats['ml_analysis'] = ml_analyzer.cache.stats()
+    return jsonify({
+        'success': True,
+        'caches': stats,
+        'jobs': job_queue.stats(),
+        'percentile_index': percentile_index.stats(),
+        'group_commit': group_writer.stats() if group_writer is not None else None
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'service': 'MedReport Analyzer API'})
 
-# Initialize database
-with app.app_context():
+def add_missing_columns(model):
+    """ALTER TABLE ADD COLUMN for nullable columns added to model after its table was created"""
+    table = model.__table__
+    existing = {column['name'] for column in db.inspect(db.engine).get_columns(table.name)}
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                connection.execute(db.text(
+                    f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN '
+                    f'{preparer.quote(column.name)} {column.type.compile(db.engine.dialect)}'
+                ))
+                print(f"Added column {table.name}.{column.name}")
+
+def init_db():
+    """Create missing tables, columns and indexes"""
     db.create_all()
+    add_missing_columns(MedicalReport)
+    # create_all skips indexes on tables that already exist
+    for model in (MedicalReport, AnalyteValue):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def create_app():
+    """Prepare the app for serving and return it.
+    
+    Installs the engine hooks, builds the percentile index and warms up the
+    model, printing how long each phase took. Servers that load app:app run
+    it on their first request instead. Later calls return the same app.
+    """
+    with startup_lock:
+        if started.is_set():
+            return app
+        startup_times['imports'] = import_time
+        
+        with app.app_context():
+            start = time.perf_counter()
+            if app.config['SQLITE_TUNING']:
+                install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+            install_query_metrics(db.engine, metrics, 'medreport_db_query_seconds', on_query=record_query)
+            if app.config['INIT_DB']:
+                init_db()
+                print("Database initialized!")
+            startup_times['database'] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            if db.inspect(db.engine).has_table(AnalyteValue.__tablename__):
+                population = db.select(AnalyteValue.analyte, AnalyteValue.value, User.age, User.gender)\
+                    .join(User, User.id == AnalyteValue.user_id)\
+                    .execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])
+                try:
+                    indexed = percentile_index.build(db.session.execute(population))
+                    print(f"Percentile index built from {indexed} values")
+                except Exception as e:
+                    # Analyses work without percentiles, so a bad row must not stop the app starting
+                    db.session.rollback()
+                    print(f"Percentile index build failed, serving without percentiles: {e}")
+            else:
+                print("Database schema missing; run `flask --app app init-db`")
+            startup_times['percentile_index'] = time.perf_counter() - start
+        
+        # Load the model before the first request instead of during it
+        if ml_analyzer is not None and app.config['ML_WARM_UP']:
+            start = time.perf_counter()
+            if model_registry.warm_up(app.config['ML_MODEL_PATH']):
+                print("Model warmed up!")
+            startup_times['model'] = time.perf_counter() - start
+        
+        if app.config['RETRAIN_INTERVAL'] > 0:
+            threading.Thread(target=retrain_loop, args=(app.config['RETRAIN_INTERVAL'],),
+                             name='model-retrainer', daemon=True).start()
+        
+        print("Startup: " + ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in startup_times.items()))
+        started.set()
+    return app
+
+def report_training_data(query):
+    """(ids, records, labels) for (id, test_data, age, gender) rows, labelled by the rule analyzer.
+    
+    Reports carry no confirmed diagnosis, so the labels are the rule engine's
+    own output and the holdout check in update_from_records measures
+    agreement with the rules, not clinical accuracy.
+    """
+    ids = []
+    test_results = []
+    records = []
+    for report_id, test_data, age, gender in db.session.execute(query.execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])):
+        ids.append(report_id)
+        test_results.append(json.loads(test_data))
+        # Age and gender are model features that reports don't store
+        records.append({'age': age, 'gender': gender, **test_results[-1]})
+    # Uncached, so training rows don't evict live entries; the most urgent condition is the label
+    labels = [analyzer.primary_condition(result) for result in analyzer.evaluate_batch(test_results)]
+    return ids, records, labels
+
+def training_rows():
+    return db.select(MedicalReport.id, MedicalReport.test_data, User.age, User.gender)\
+        .join(User, User.id == MedicalReport.user_id)
+
+def examined_watermark(version):
+    """Last report id a rejected update of this model version examined, or 0"""
+    try:
+        with open(app.config['RETRAIN_STATE_PATH']) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    return state.get('examined', 0) if state.get('version') == version else 0
+
+def save_examined_watermark(version, examined):
+    path = app.config['RETRAIN_STATE_PATH']
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': version, 'examined': examined}, f)
+    os.replace(path + '.tmp', path)
+
+def retrain_model():
+    """Update the model from reports stored since its watermark; returns a summary"""
+    from ml_trainer import MedicalTestAnalyzer, model_registry
+    trainer = ml_analyzer or MedicalTestAnalyzer(app.config['ML_MODEL_PATH'])
+    bundle = model_registry.get(trainer.model_path)
+    if bundle is None:
+        return {'published': False, 'reason': 'no model to update'}
+    
+    # The published model's watermark is the last report id it has seen; rows a rejected
+    # update examined after that are skipped too, so runs only cost the new reports
+    watermark = max((bundle.get('metadata') or {}).get('watermark', 0), examined_watermark(bundle['version']))
+    ids, records, labels = report_training_data(
+        training_rows()
+        .where(MedicalReport.id > watermark)
+        .order_by(MedicalReport.id)
+        .limit(app.config['RETRAIN_MAX_ROWS'])
+    )
+    
+    def load_window():
+        # Most recent reports, back in arrival order
+        _, window_records, window_labels = report_training_data(
+            training_rows()
+            .order_by(MedicalReport.id.desc())
+            .limit(app.config['RETRAIN_WINDOW'])
+        )
+        return window_records[::-1], window_labels[::-1]
+    
+    result = trainer.update_from_records(
+        records, labels,
+        watermark=ids[-1] if ids else watermark,
+        load_window=load_window,
+        new_trees=app.config['RETRAIN_NEW_TREES'],
+        max_trees=app.config['RETRAIN_MAX_TREES'],
+        min_rows=app.config['RETRAIN_MIN_ROWS']
+    )
+    if not result['published'] and 'watermark' in result:
+        save_examined_watermark(bundle['version'], result['watermark'])
+    return result
+
+def retrain_loop(interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                result = retrain_model()
+            except Exception as e:
+                result = {'published': False, 'reason': f"failed: {e}"}
+        if result['published']:
+            outcome = 'published'
+        else:
+            outcome = 'rejected' if 'watermark' in result else 'skipped'
+        metrics.inc('medreport_retrain_runs_total', outcome=outcome)
+        print(f"Model update {outcome}: {result}")
+
+@app.cli.command('retrain-model')
+def retrain_model_command():
+    """Update the model from reports stored since the last update"""
+    print(retrain_model())
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database schema; run once per deployment, not per worker"""
+    init_db()
     print("Database initialized!")
 
+@app.cli.command('backfill-analytes')
+def backfill_analytes():
+    """Populate analyte values for reports saved before the table existed"""
+    # Creates the report_id index the NOT EXISTS check below relies on
+    init_db()
+    # Correlated per report, so each check is one index probe instead of a rebuilt id list
+    done = db.exists().where(AnalyteValue.report_id == MedicalReport.id)
+    last_id = 0
+    count = 0
+    while True:
+        # Walk reports in id order, one committed batch at a time; plain rows, so assigning
+        # values never lazy-loads (and autoflushes) a report's existing collection
+        batch = db.session.execute(
+            db.select(MedicalReport.id, MedicalReport.user_id, MedicalReport.test_data, MedicalReport.timestamp)
+            .where(MedicalReport.id > last_id, ~done)
+            .order_by(MedicalReport.id).limit(app.config['EXPORT_BATCH_SIZE'])
+        ).all()
+        if not batch:
+            break
+        for report in batch:
+            values = analyte_values(report.user_id, json.loads(report.test_data), report.timestamp)
+            for value in values:
+                value.report_id = report.id
+            db.session.add_all(values)
+        db.session.commit()
+        last_id = batch[-1].id
+        count += len(batch)
+    print(f"Backfilled analyte values for {count} reports")
+
+import_time = time.perf_counter() - IMPORT_START
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # The development server creates the schema itself
+    app.config['INIT_DB'] = True
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
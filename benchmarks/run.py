@@ -0,0 +1,209 @@
+"""Benchmark suite for the analyzers, models and API endpoints.
+
+Generates synthetic data at the requested scale, runs microbenchmarks and
+concurrent endpoint load through the Flask test client, and prints one JSON
+document (p50/p95/p99 latency, throughput, peak RSS) that can be diffed
+between runs:
+
+    python benchmarks/run.py --users 100 --reports 10000 --clients 8 --output before.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import PASSWORD, make_panels, populate
+
+def summarize(latencies, elapsed=None):
+    latencies = np.asarray(latencies) * 1000
+    elapsed = latencies.sum() / 1000 if elapsed is None else elapsed
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'count': int(len(latencies)),
+        'mean_ms': round(float(latencies.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'throughput_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None
+    }
+
+def time_calls(func, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+def bench_micro(medreport, iterations, rng, workdir):
+    results = {}
+    panels = make_panels(rng, iterations)
+
+    # Fresh analyzer: unique panels miss the cache, repeats of one panel hit it
+    analyzer = medreport.MedicalAnalyzer()
+    results['MedicalAnalyzer.analyze[miss]'] = time_calls(analyzer.analyze, panels)
+    results['MedicalAnalyzer.analyze[hit]'] = time_calls(analyzer.analyze, [panels[0]] * iterations)
+    start = time.perf_counter()
+    medreport.MedicalAnalyzer().analyze_batch(panels)
+    elapsed = time.perf_counter() - start
+    results['MedicalAnalyzer.analyze_batch'] = {
+        'count': iterations,
+        'total_ms': round(elapsed * 1000, 3),
+        'throughput_per_sec': round(iterations / elapsed, 1)
+    }
+
+    with medreport.app.app_context():
+        reports = medreport.MedicalReport.query.limit(iterations).all()
+        if reports:
+            results['MedicalReport.to_dict'] = time_calls(lambda report: report.to_dict(), reports)
+
+    # The model is trained on the bundled sample CSV into the scratch directory
+    from ml_trainer import ModelRegistry, MedicalTestAnalyzer
+    model_path = os.path.join(workdir, 'bench_model.pkl')
+    trainer = MedicalTestAnalyzer(model_path, registry=ModelRegistry())
+    trainer.load_data(os.path.join(ROOT, 'medical_tests.csv'))
+    records = [dict(panel, age=40, gender='Male', blood_pressure=panel['systolic']) for panel in panels[:200]]
+    results['MedicalTestAnalyzer.predict'] = time_calls(trainer.predict, records)
+    start = time.perf_counter()
+    trainer.predict_many(records)
+    elapsed = time.perf_counter() - start
+    results['MedicalTestAnalyzer.predict_many'] = {
+        'count': len(records),
+        'total_ms': round(elapsed * 1000, 3),
+        'throughput_per_sec': round(len(records) / elapsed, 1)
+    }
+    return results
+
+def bench_endpoint(medreport, user_ids, clients, requests, send, login=True):
+    """Run requests spread over concurrent test clients, one user per client"""
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    per_client = max(1, requests // clients)
+    ready = threading.Barrier(clients + 1)
+
+    def client_loop(index):
+        client = medreport.app.test_client()
+        username = f'bench-user-{index % len(user_ids)}'
+        if login:
+            client.post('/api/login', json={'username': username, 'password': PASSWORD})
+        ready.wait()
+        for request_index in range(per_client):
+            start = time.perf_counter()
+            response = send(client, username, request_index)
+            latencies[index].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=client_loop, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = summarize([latency for client in latencies for latency in client], elapsed)
+    result['errors'] = sum(errors)
+    return result
+
+def bench_endpoints(medreport, user_ids, clients, requests, rng):
+    panels = make_panels(rng, requests)
+    return {
+        'POST /api/login': bench_endpoint(
+            medreport, user_ids, clients, requests, login=False,
+            send=lambda client, username, index: client.post(
+                '/api/login', json={'username': username, 'password': PASSWORD})
+        ),
+        'POST /api/analyze-report': bench_endpoint(
+            medreport, user_ids, clients, requests,
+            send=lambda client, username, index: client.post(
+                '/api/analyze-report', json={'test_results': panels[index], 'report_name': 'Benchmark'})
+        ),
+        'GET /api/report-history': bench_endpoint(
+            medreport, user_ids, clients, requests,
+            send=lambda client, username, index: client.get('/api/report-history?limit=50')
+        )
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--reports', type=int, default=10000, help='synthetic reports to generate (1k to 10M)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per bulk insert')
+    parser.add_argument('--iterations', type=int, default=2000, help='calls per microbenchmark')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent endpoint clients')
+    parser.add_argument('--requests', type=int, default=800, help='requests per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='existing SQLite file to reuse instead of generating data')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='medreport-bench-')
+    database = args.database or os.path.join(workdir, 'bench.db')
+    os.environ['MEDREPORT_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(database)
+    os.environ['MEDREPORT_INIT_DB'] = '1'
+
+    import_start = time.perf_counter()
+    import app as medreport
+    medreport.create_app()
+    startup_time = time.perf_counter() - import_start
+
+    rng = np.random.default_rng(args.seed)
+    populate_time = None
+    if args.database:
+        with medreport.app.app_context():
+            user_ids = [row.id for row in medreport.db.session.query(medreport.User.id)
+                        .filter(medreport.User.username.like('bench-user-%'))]
+    else:
+        start = time.perf_counter()
+        user_ids = populate(medreport, users=args.users, reports=args.reports,
+                            batch_size=args.batch_size, seed=args.seed)
+        populate_time = time.perf_counter() - start
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+            'app_startup_s': round(startup_time, 3),
+            'populate_s': round(populate_time, 3) if populate_time is not None else None
+        },
+        'micro': bench_micro(medreport, args.iterations, rng, workdir),
+        'endpoints': bench_endpoints(medreport, user_ids, args.clients, args.requests, rng),
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
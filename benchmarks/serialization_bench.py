@@ -0,0 +1,113 @@
+"""Response serialization benchmark: CPU per request and bytes on the wire.
+
+Compares the previous history encoding (to_dict() parsing test_data, then
+the standard library encoder) with the spliced to_json() path, and the full
+GET /api/report-history request with and without gzip:
+
+    python benchmarks/serialization_bench.py --reports 5000 --limit 200 --output serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import PASSWORD, populate
+
+def cpu_per_call(func, iterations):
+    """Mean process CPU milliseconds per call; the output of the last call is returned too"""
+    result = func()
+    start = time.process_time()
+    for _ in range(iterations):
+        result = func()
+    return round((time.process_time() - start) * 1000 / iterations, 4), result
+
+def bench_encoding(medreport, limit, iterations):
+    from flask.json.provider import DefaultJSONProvider
+    from serialization import RawJSON, encode
+    stdlib = DefaultJSONProvider(medreport.app)
+
+    results = {}
+    with medreport.app.app_context():
+        reports = medreport.MedicalReport.query.order_by(medreport.MedicalReport.id.desc()).limit(limit).all()
+        analysis = json.loads(reports[0].analysis_json)
+
+        def legacy():
+            return stdlib.dumps({'success': True, 'reports': [report.to_dict() for report in reports]},
+                                separators=(',', ':'))
+
+        def spliced():
+            return encode({'success': True, 'reports': [RawJSON(report.to_json()) for report in reports]})
+
+        for name, func in (('history[to_dict+json]', legacy), ('history[to_json splice]', spliced)):
+            cpu_ms, body = cpu_per_call(func, iterations)
+            results[name] = {'cpu_ms': cpu_ms, 'bytes': len(body.encode())}
+
+        analysis_json = reports[0].analysis_json
+        for name, func in (
+            ('analysis[json]', lambda: stdlib.dumps({'success': True, 'analysis': analysis}, separators=(',', ':'))),
+            ('analysis[provider]', lambda: medreport.app.json.dumps({'success': True, 'analysis': analysis})),
+            ('analysis[splice]', lambda: encode({'success': True, 'analysis': RawJSON(analysis_json)}))
+        ):
+            results[name] = {'cpu_ms': cpu_per_call(func, iterations * 10)[0]}
+    return results
+
+def bench_history(medreport, limit, iterations):
+    """Whole requests through the test client; gzip adds compression CPU but cuts the bytes sent"""
+    client = medreport.app.test_client()
+    client.post('/api/login', json={'username': 'bench-user-0', 'password': PASSWORD})
+    results = {}
+    for encoding in ('identity', 'gzip'):
+        def request():
+            return client.get(f'/api/report-history?limit={limit}', headers={'Accept-Encoding': encoding})
+        cpu_ms, response = cpu_per_call(request, iterations)
+        results[encoding] = {
+            'cpu_ms': cpu_ms,
+            'bytes': len(response.data),
+            'content_encoding': response.headers.get('Content-Encoding')
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=200, help='history page size')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='medreport-bench-')
+    os.environ['MEDREPORT_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['MEDREPORT_INIT_DB'] = '1'
+
+    import app as medreport
+    import serialization
+    medreport.create_app()
+    # One user so a history page is always full
+    populate(medreport, users=1, reports=args.reports, seed=args.seed)
+
+    results = {
+        'meta': {
+            'orjson': serialization.orjson is not None,
+            'gzip_level': medreport.app.config['GZIP_LEVEL'],
+            'args': vars(args)
+        },
+        'encoding': bench_encoding(medreport, args.limit, args.iterations),
+        'GET /api/report-history': bench_history(medreport, args.limit, args.iterations)
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
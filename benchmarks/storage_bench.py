@@ -0,0 +1,120 @@
+"""Concurrent read/write throughput of the storage layer under each configuration.
+
+Every configuration runs in its own process against a fresh database file,
+because the storage settings are read when app.py is imported:
+
+    python benchmarks/storage_bench.py --writers 8 --readers 8 --duration 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = {
+    'default': {'MEDREPORT_SQLITE_TUNING': '0', 'MEDREPORT_GROUP_COMMIT': '0'},
+    'wal': {'MEDREPORT_SQLITE_TUNING': '1', 'MEDREPORT_GROUP_COMMIT': '0'},
+    'wal+group_commit': {'MEDREPORT_SQLITE_TUNING': '1', 'MEDREPORT_GROUP_COMMIT': '1'}
+}
+
+def run_worker(writers, readers, duration):
+    sys.path.insert(0, ROOT)
+    import app as medreport
+    medreport.create_app()
+
+    with medreport.app.app_context():
+        user = medreport.User(username='bench', email='bench@example.com', password='bench', age=40, gender='Female')
+        medreport.db.session.add(user)
+        medreport.db.session.commit()
+        user_id = user.id
+
+    panel = {'glucose': 105, 'systolic': 128, 'diastolic': 84, 'cholesterol': 210, 'bmi': 26.1}
+    stop = threading.Event()
+    counts = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+
+    def write():
+        done = errors = 0
+        while not stop.is_set():
+            with medreport.app.app_context():
+                try:
+                    medreport.run_analysis(user_id, 'Benchmark', panel)
+                    done += 1
+                except Exception:
+                    medreport.db.session.rollback()
+                    errors += 1
+        with lock:
+            counts['writes'] += done
+            counts['write_errors'] += errors
+
+    def read():
+        done = errors = 0
+        report = medreport.MedicalReport
+        while not stop.is_set():
+            with medreport.app.app_context():
+                try:
+                    medreport.db.session.query(report.id, report.report_name, report.timestamp)\
+                        .filter(report.user_id == user_id)\
+                        .order_by(report.timestamp.desc(), report.id.desc()).limit(50).all()
+                    done += 1
+                except Exception:
+                    errors += 1
+        with lock:
+            counts['reads'] += done
+            counts['read_errors'] += errors
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    counts['writes_per_sec'] = round(counts['writes'] / duration, 1)
+    counts['reads_per_sec'] = round(counts['reads'] / duration, 1)
+    print(json.dumps(counts))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.writers, args.readers, args.duration)
+        return
+
+    results = {}
+    for name, env in CONFIGURATIONS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            worker_env = dict(os.environ, **env)
+            worker_env['MEDREPORT_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+            worker_env['MEDREPORT_INIT_DB'] = '1'
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker',
+                 '--writers', str(args.writers), '--readers', str(args.readers),
+                 '--duration', str(args.duration)],
+                env=worker_env, cwd=directory, capture_output=True, text=True, check=True
+            ).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:>18}: {results[name]['writes_per_sec']:>8} writes/s {results[name]['reads_per_sec']:>8} reads/s "
+              f"({results[name]['write_errors']} write errors)", file=sys.stderr)
+
+    print(json.dumps({
+        'writers': args.writers,
+        'readers': args.readers,
+        'duration': args.duration,
+        'results': results
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Synthetic users and reports for benchmarks, bulk-inserted at any scale."""
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# (mean, standard deviation) per analyte, roughly centred on the normal ranges
+ANALYTES = {
+    'glucose': (95, 18),
+    'systolic': (120, 15),
+    'diastolic': (80, 10),
+    'cholesterol': (195, 35),
+    'heart_rate': (75, 12),
+    'bmi': (25, 4),
+    'hemoglobin': (14, 1.5),
+    'wbc': (7.5, 2),
+    'rbc': (5.0, 0.5)
+}
+
+PASSWORD = 'benchmark'
+
+def make_panels(rng, count):
+    """count random panels with a random subset of at least three analytes"""
+    names = list(ANALYTES)
+    means = np.array([ANALYTES[name][0] for name in names])
+    stds = np.array([ANALYTES[name][1] for name in names])
+    values = np.round(rng.normal(means, stds, size=(count, len(names))), 1)
+    present = rng.random((count, len(names))) < 0.7
+    present[:, :3] = True
+    return [
+        {name: float(value) for name, value, keep in zip(names, row, mask) if keep}
+        for row, mask in zip(values, present)
+    ]
+
+def populate(medreport, users=100, reports=1000, batch_size=5000, seed=0, analyte_values=True):
+    """Insert users and reports through Core executemany; returns the user ids"""
+    rng = np.random.default_rng(seed)
+    db = medreport.db
+    now = datetime.utcnow()
+    genders = ('Male', 'Female')
+
+    with medreport.app.app_context():
+        user_rows = [
+            {
+                'username': f'bench-user-{index}',
+                'email': f'bench-user-{index}@example.com',
+                'password': PASSWORD,
+                'age': int(rng.integers(18, 90)),
+                'gender': genders[index % 2],
+                'created_at': now
+            }
+            for index in range(users)
+        ]
+        db.session.execute(medreport.User.__table__.insert(), user_rows)
+        db.session.commit()
+        user_ids = [row.id for row in db.session.query(medreport.User.id)
+                    .filter(medreport.User.username.like('bench-user-%')).order_by(medreport.User.id)]
+
+        next_id = (db.session.query(db.func.max(medreport.MedicalReport.id)).scalar() or 0) + 1
+        for start in range(0, reports, batch_size):
+            count = min(batch_size, reports - start)
+            panels = make_panels(rng, count)
+            analyses = medreport.analyzer.evaluate_batch(panels)
+            owners = rng.choice(user_ids, size=count)
+            # Spread reports over the last two years
+            timestamps = [now - timedelta(minutes=int(offset)) for offset in rng.integers(0, 2 * 365 * 24 * 60, size=count)]
+
+            report_rows = []
+            value_rows = []
+            for offset, (panel, analysis, owner, timestamp) in enumerate(zip(panels, analyses, owners, timestamps)):
+                report_id = next_id + start + offset
+                report_rows.append({
+                    'id': report_id,
+                    'user_id': int(owner),
+                    'report_name': 'Synthetic panel',
+                    'test_data': json.dumps(panel),
+                    'analysis_result': analysis['analysis'],
+                    'recommendations': analysis['recommendations'],
+                    'analysis_json': json.dumps(analysis),
+                    'timestamp': timestamp
+                })
+                if analyte_values:
+                    value_rows.extend(
+                        {'report_id': report_id, 'user_id': int(owner), 'analyte': name,
+                         'value': value, 'timestamp': timestamp}
+                        for name, value in panel.items()
+                    )
+            db.session.execute(medreport.MedicalReport.__table__.insert(), report_rows)
+            if value_rows:
+                db.session.execute(medreport.AnalyteValue.__table__.insert(), value_rows)
+            db.session.commit()
+
+    return user_ids
@@ -68,6 +68,13 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Older reports are fetched a page at a time
+    document.getElementById('loadMoreHistory').addEventListener('click', function() {
+        if (historyCursor) {
+            loadReportHistory(historyCursor);
+        }
+    });
+    
     // Load report history
     loadReportHistory();
 });
@@ -112,36 +119,58 @@ function displayAnalysisResult(analysis) {
     resultDiv.scrollIntoView({ behavior: 'smooth' });
 }
 
-async function loadReportHistory() {
+// Keyset cursor for the next, older page of history; null once everything is shown
+let historyCursor = null;
+
+function renderHistoryItem(report) {
+    return `
+        <div class="history-item">
+            <div class="history-header">
+                <h4>${report.report_name}</h4>
+                <span class="history-date">${new Date(report.timestamp).toLocaleDateString()}</span>
+            </div>
+            <div class="test-data">
+                <strong>Tests:</strong> ${Object.keys(report.test_data).join(', ')}
+            </div>
+            <div class="analysis-preview">
+                ${report.analysis_result.substring(0, 100)}...
+            </div>
+        </div>
+    `;
+}
+
+async function loadReportHistory(cursor = null) {
+    const historyList = document.getElementById('historyList');
+    const loadMore = document.getElementById('loadMoreHistory');
+    
     try {
-        const response = await fetch(`${API_BASE}/report-history`, {
+        let url = `${API_BASE}/report-history?limit=20`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const response = await fetch(url, {
             credentials: 'include'
         });
         
         const data = await response.json();
         
-        const historyList = document.getElementById('historyList');
-        
         if (data.success && data.reports.length > 0) {
-            historyList.innerHTML = data.reports.map(report => `
-                <div class="history-item">
-                    <div class="history-header">
-                        <h4>${report.report_name}</h4>
-                        <span class="history-date">${new Date(report.timestamp).toLocaleDateString()}</span>
-                    </div>
-                    <div class="test-data">
-                        <strong>Tests:</strong> ${Object.keys(report.test_data).join(', ')}
-                    </div>
-                    <div class="analysis-preview">
-                        ${report.analysis_result.substring(0, 100)}...
-                    </div>
-                </div>
-            `).join('');
-        } else {
+            const items = data.reports.map(renderHistoryItem).join('');
+            if (cursor) {
+                historyList.insertAdjacentHTML('beforeend', items);
+            } else {
+                historyList.innerHTML = items;
+            }
+            historyCursor = data.next_cursor;
+        } else if (!cursor) {
             historyList.innerHTML = '<div class="loading">No reports yet. Analyze your first report above!</div>';
+            historyCursor = null;
         }
+        loadMore.style.display = historyCursor ? 'inline-block' : 'none';
     } catch (error) {
         console.error('Error loading history:', error);
-        document.getElementById('historyList').innerHTML = '<div class="loading">Error loading history</div>';
+        if (!cursor) {
+            historyList.innerHTML = '<div class="loading">Error loading history</div>';
+        }
     }
 }
\ No newline at end of file
@@ -0,0 +1,155 @@
+import json
+import os
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+LAYOUT_VERSION = 1
+# Rows traversed at once; bounds the (rows x trees) index arrays
+BATCH_ROWS = 4096
+
+def float32_floor(values):
+    """Largest float32 <= each value, so float32 inputs compare exactly as against float64"""
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+class CompactForest:
+    """A fitted tree ensemble flattened into contiguous NumPy arrays.
+
+    All trees share one node table: feature and threshold describe each
+    split and children holds the left and right child. Leaves split on
+    feature 0 at +inf and point at themselves, so traversal advances every
+    (row, tree) pair one level per vectorized step and drops the pairs that
+    stop moving. value holds each node's class probabilities, optionally
+    quantized to unsigned integers that are divided by value_scale.
+
+    Inputs are cast to float32 first, as scikit-learn does, so predictions
+    match the original forest up to the storage precision of value.
+    """
+    def __init__(self, feature, threshold, children, value, roots, classes, depth, value_scale=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.depth = depth
+        self.value_scale = value_scale
+
+    @classmethod
+    def from_sklearn(cls, model, dtype=np.float32, quantize=None):
+        """Flatten a fitted forest (or single tree) classifier.
+
+        dtype is the threshold precision; quantize=8 or 16 stores leaf
+        probabilities as uint8/uint16 instead of float32.
+        """
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output classifiers can be compacted")
+        estimators = getattr(model, 'estimators_', [model])
+        if not all(hasattr(estimator, 'tree_') for estimator in estimators):
+            raise ValueError("Only tree and forest classifiers can be compacted")
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            index = np.arange(tree.node_count) + offset
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            children.append(np.column_stack([
+                np.where(leaf, index, tree.children_left + offset),
+                np.where(leaf, index, tree.children_right + offset)
+            ]))
+            # Older scikit-learn stores weighted class counts; normalize them to probabilities
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1
+            values.append(value / totals)
+            roots.append(offset)
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        threshold = np.concatenate(thresholds)
+        threshold = float32_floor(threshold) if np.dtype(dtype) == np.float32 else threshold.astype(np.float64)
+        value = np.concatenate(values)
+        value_scale = None
+        if quantize:
+            if quantize not in (8, 16):
+                raise ValueError("quantize must be 8 or 16 bits")
+            value_scale = 2 ** quantize - 1
+            value = np.rint(value * value_scale).astype(np.uint8 if quantize == 8 else np.uint16)
+        else:
+            value = value.astype(np.float32)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=threshold,
+            children=np.concatenate(children).astype(np.int32),
+            value=value,
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            depth=int(depth),
+            value_scale=value_scale
+        )
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def save(self, directory):
+        """One .npy file per array plus forest.json, all loadable with mmap"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        meta = {
+            'layout': LAYOUT_VERSION,
+            'classes': self.classes_.tolist(),
+            'depth': self.depth,
+            'value_scale': self.value_scale
+        }
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        with open(os.path.join(directory, 'forest.json')) as f:
+            meta = json.load(f)
+        if meta['layout'] != LAYOUT_VERSION:
+            raise ValueError(f"Unsupported compact forest layout {meta['layout']}")
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(classes=np.array(meta['classes']), depth=meta['depth'], value_scale=meta['value_scale'], **arrays)
+
+    def apply(self, X):
+        """Leaf node of every tree for every row, shape (rows, trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_trees = len(self.roots)
+        flat = X.ravel()
+        nodes = np.tile(self.roots, len(X))
+        # Offset of each pair's row in flat
+        base = np.repeat(np.arange(len(X), dtype=np.intp) * X.shape[1], n_trees)
+        active = np.arange(len(nodes))
+        for _ in range(self.depth):
+            current = nodes[active]
+            go_right = flat[base[active] + self.feature[current]] > self.threshold[current]
+            following = self.children[current, go_right.view(np.int8)]
+            nodes[active] = following
+            active = active[following != current]
+            if not len(active):
+                break
+        return nodes.reshape(len(X), n_trees)
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), BATCH_ROWS):
+            leaves = self.apply(X[start:start + BATCH_ROWS])
+            proba[start:start + BATCH_ROWS] = self.value[leaves].sum(axis=1, dtype=np.float64)
+        proba /= len(self.roots) * (self.value_scale or 1)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the pending queue is full"""
+
+class JobQueue:
+    """Bounded in-process worker pool whose job results can be polled by id.
+
+    Workers start on the first submit, so importing the app (or forking
+    workers from it) never starts threads. Finished jobs are kept for
+    result_ttl seconds and at most max_jobs are remembered.
+    """
+    def __init__(self, workers=4, max_pending=100, result_ttl=600, max_jobs=10000):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, func, *args, owner=None):
+        """Queue func(*args) and return its job id, or raise QueueFullError"""
+        self._start()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'owner': owner,
+            'status': 'queued',
+            'result': None,
+            'error': None,
+            'submitted_at': time.time(),
+            'finished_at': None
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, func, args))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            raise QueueFullError('Analysis queue is full')
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'workers': self.workers,
+            'pending': self._queue.qsize(),
+            'max_pending': self._queue.maxsize,
+            'jobs': counts
+        }
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'analysis-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job_id, func, args = self._queue.get()
+            self._update(job_id, status='running')
+            try:
+                result = func(*args)
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+            else:
+                self._update(job_id, status='done', result=result, finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _prune(self):
+        # Drop expired finished jobs, then the oldest finished ones beyond max_jobs
+        cutoff = time.time() - self.result_ttl
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished_at'] is not None]
+        for job_id in finished:
+            if self._jobs[job_id]['finished_at'] < cutoff or len(self._jobs) > self.max_jobs:
+                del self._jobs[job_id]
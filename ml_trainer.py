@@ -1,72 +1,614 @@
-import pandas as pd
+# pandas, scikit-learn and joblib are imported where they are used, so serving
+# processes only pay for them when a model is trained or first loaded
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split
-import joblib
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import copy
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+import warnings
+from types import SimpleNamespace
+from result_cache import ResultCache, content_key
+
+DEFAULT_MODEL_PATH = 'medical_model.pkl'
+# Bundle entries rebuilt on load rather than pickled
+DERIVED_KEYS = ('version', 'pipeline')
+# A compact model is a directory of arrays; this file's digest is its version
+COMPACT_MANIFEST = 'manifest.json'
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def model_file(path):
+    """The file whose content identifies the model at path"""
+    return os.path.join(path, COMPACT_MANIFEST) if os.path.isdir(path) else path
+
+def serving_threads(model):
+    """Drop the training n_jobs so predictions run inline.
+    
+    Serving scores one or a few rows per call, where dispatching to a joblib
+    thread pool costs more than the trees themselves.
+    """
+    if getattr(model, 'n_jobs', None) not in (None, 1):
+        model.set_params(n_jobs=None)
+    return model
+
+class FeaturePipeline:
+    """Encoders, scaler and model compiled into plain dicts and arrays for scoring"""
+    def __init__(self, bundle):
+        self.model = bundle['model']
+        self.feature_columns = list(bundle['feature_columns'])
+        label_encoders = bundle['label_encoders']
+        scaler = bundle['scaler']
+        
+        # category -> code maps replace LabelEncoder.transform; unknown values map to 0
+        self.columns = []
+        for index, col in enumerate(self.feature_columns):
+            codes = None
+            if col in label_encoders:
+                codes = {value: code for code, value in enumerate(label_encoders[col].classes_)}
+            self.columns.append((index, col, codes))
+        
+        # The scaler only covers the numeric training columns, in its own order
+        if hasattr(scaler, 'feature_names_in_'):
+            scaled_columns = list(scaler.feature_names_in_)
+        else:
+            scaled_columns = [col for _, col, codes in self.columns if codes is None]
+        self.scaled_index = np.array([self.feature_columns.index(col) for col in scaled_columns], dtype=np.intp)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        
+        # Missing numeric values fall back to the training mean, as in load_data
+        self.fill = np.zeros(len(self.feature_columns))
+        self.fill[self.scaled_index] = self.mean
+        
+        self.classes = label_encoders['target'].classes_[self.model.classes_.astype(np.intp)]
+        self.named_features = hasattr(self.model, 'feature_names_in_')
+        self._local = threading.local()
+    
+    def fill_row(self, out, record):
+        for index, col, codes in self.columns:
+            value = record.get(col)
+            if codes is not None:
+                out[index] = codes.get(str(value), 0)
+            elif value is None:
+                out[index] = self.fill[index]
+            else:
+                out[index] = float(value)
+    
+    def predict_proba(self, X):
+        X[:, self.scaled_index] -= self.mean
+        X[:, self.scaled_index] /= self.scale
+        if self.named_features:
+            # Models fitted on a DataFrame warn on every array input
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                return self.model.predict_proba(X)
+        return self.model.predict_proba(X)
+    
+    def decode(self, probabilities):
+        best = probabilities.argmax(axis=1)
+        return [
+            (str(self.classes[index]), round(float(row[index]) * 100, 2))
+            for index, row in zip(best, probabilities)
+        ]
+    
+    def encode(self, records):
+        """Scaled feature matrix for records, plus the positions of the records that could be encoded"""
+        X = np.empty((len(records), len(self.feature_columns)))
+        positions = []
+        for position, record in enumerate(records):
+            try:
+                self.fill_row(X[len(positions)], record)
+            except (TypeError, ValueError):
+                continue
+            positions.append(position)
+        X = X[:len(positions)]
+        X[:, self.scaled_index] -= self.mean
+        X[:, self.scaled_index] /= self.scale
+        return X, positions
+    
+    def predict_one(self, record):
+        # Reuse a per-thread row buffer instead of allocating a frame per call
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(self.feature_columns)))
+        self.fill_row(row[0], record)
+        return self.decode(self.predict_proba(row))[0]
+    
+    def predict_many(self, records):
+        X = np.empty((len(records), len(self.feature_columns)))
+        valid = []
+        results = [None] * len(records)
+        for position, record in enumerate(records):
+            try:
+                self.fill_row(X[len(valid)], record)
+            except (TypeError, ValueError) as e:
+                results[position] = (f"Prediction error: {str(e)}", 0.0)
+                continue
+            valid.append(position)
+        
+        if valid:
+            for position, result in zip(valid, self.decode(self.predict_proba(X[:len(valid)]))):
+                results[position] = result
+        return results
+
+class ModelRegistry:
+    """Process-wide cache of trained model bundles, reloaded when the file changes"""
+    def __init__(self, check_interval=2.0, mmap_mode=None):
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, path=DEFAULT_MODEL_PATH):
+        """Return the current bundle for path, or None if no model exists yet"""
+        entry = self._entries.get(path)
+        if entry is not None and time.monotonic() - entry['checked_at'] < self.check_interval:
+            return entry['bundle']
+        
+        with self._lock:
+            entry = self._entries.get(path)
+            now = time.monotonic()
+            if entry is not None and now - entry['checked_at'] < self.check_interval:
+                return entry['bundle']
+            
+            try:
+                stat = os.stat(model_file(path))
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if entry is None or entry['signature'] != signature:
+                    # Only reload when the content actually changed, not just the mtime
+                    version = file_digest(model_file(path))
+                    if entry is None or entry['version'] != version:
+                        if os.path.isdir(path):
+                            bundle = load_compact(path, mmap_mode=self.mmap_mode)
+                        else:
+                            import joblib
+                            bundle = joblib.load(path, mmap_mode=self.mmap_mode)
+                            # Files saved before save_model reset n_jobs still carry the training value
+                            serving_threads(bundle['model'])
+                        bundle['version'] = version
+                        bundle['pipeline'] = FeaturePipeline(bundle)
+                        print(f"Loaded model {path} (version {version[:12]})")
+                    else:
+                        bundle = entry['bundle']
+                    entry = {'bundle': bundle, 'version': version, 'signature': signature}
+                else:
+                    entry = dict(entry)
+            except FileNotFoundError:
+                # Keep serving the last good version if the file disappears
+                return entry['bundle'] if entry else None
+            
+            # Swap the whole entry so readers never see a half-updated one
+            entry['checked_at'] = now
+            self._entries[path] = entry
+            return entry['bundle']
+    
+    def version(self, path=DEFAULT_MODEL_PATH):
+        bundle = self.get(path)
+        return bundle['version'] if bundle else None
+    
+    def publish(self, path, bundle):
+        """Atomically write a bundle to path and make it the current version"""
+        import joblib
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        joblib.dump({key: value for key, value in bundle.items() if key not in DERIVED_KEYS}, tmp_path)
+        os.replace(tmp_path, path)
+        
+        stat = os.stat(path)
+        version = file_digest(path)
+        bundle['version'] = version
+        bundle['pipeline'] = FeaturePipeline(bundle)
+        with self._lock:
+            self._entries[path] = {
+                'bundle': bundle,
+                'version': version,
+                'signature': (stat.st_mtime_ns, stat.st_size),
+                'checked_at': time.monotonic()
+            }
+        return version
+    
+    def warm_up(self, path=DEFAULT_MODEL_PATH):
+        """Load the model and run one prediction so the first request pays nothing"""
+        bundle = self.get(path)
+        if bundle is None:
+            return False
+        
+        sample = {}
+        for col in bundle['feature_columns']:
+            if col in bundle['label_encoders']:
+                sample[col] = bundle['label_encoders'][col].classes_[0]
+            else:
+                sample[col] = 0.0
+        MedicalTestAnalyzer(path, registry=self).predict(sample)
+        return True
+
+model_registry = ModelRegistry()
+
+def export_compact(bundle, directory, dtype=np.float32, quantize=None):
+    """Write a bundle's forest as memory-mappable arrays next to its preprocessing state.
+    
+    The directory can be used anywhere a model path is expected. Encoders
+    and scaler are stored as plain JSON, so loading it imports neither
+    scikit-learn nor joblib. Returns the CompactForest.
+    """
+    from forest import CompactForest
+    
+    forest = CompactForest.from_sklearn(bundle['model'], dtype=dtype, quantize=quantize)
+    scaler = bundle['scaler']
+    feature_names = getattr(scaler, 'feature_names_in_', None)
+    preprocessing = {
+        'feature_columns': list(bundle['feature_columns']),
+        'target_column': bundle.get('target_column'),
+        'label_encoders': {col: encoder.classes_.tolist() for col, encoder in bundle['label_encoders'].items()},
+        'scaler': {
+            'mean_': np.asarray(scaler.mean_).tolist(),
+            'scale_': np.asarray(scaler.scale_).tolist(),
+            'feature_names_in_': feature_names.tolist() if feature_names is not None else None
+        },
+        'metadata': bundle.get('metadata')
+    }
+    
+    tmp_path = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    forest.save(tmp_path)
+    with open(os.path.join(tmp_path, 'preprocessing.json'), 'w') as f:
+        json.dump(preprocessing, f, default=str)
+    # Written last, so a directory with a manifest is always complete
+    manifest = {name: file_digest(os.path.join(tmp_path, name)) for name in sorted(os.listdir(tmp_path))}
+    with open(os.path.join(tmp_path, COMPACT_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    # Directories can't be replaced atomically; the registry keeps the old
+    # version during the brief gap, and open memory maps stay valid
+    old_path = f"{directory}.old-{os.getpid()}"
+    if os.path.isdir(directory):
+        os.rename(directory, old_path)
+    os.rename(tmp_path, directory)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return forest
+
+def load_compact(directory, mmap_mode=None):
+    """Bundle for a directory written by export_compact"""
+    from forest import CompactForest
+    
+    with open(os.path.join(directory, 'preprocessing.json')) as f:
+        bundle = json.load(f)
+    # Stand-ins exposing the fitted attributes FeaturePipeline reads
+    bundle['label_encoders'] = {
+        col: SimpleNamespace(classes_=np.array(classes, dtype=object))
+        for col, classes in bundle['label_encoders'].items()
+    }
+    scaler = {name: np.array(value) for name, value in bundle['scaler'].items() if value is not None}
+    bundle['scaler'] = SimpleNamespace(**scaler)
+    bundle['model'] = CompactForest.load(directory, mmap_mode=mmap_mode)
+    return bundle
+
+def compare_pipelines(reference, candidate, records):
+    """Label agreement and largest probability difference between two pipelines"""
+    X = np.empty((len(records), len(reference.feature_columns)))
+    rows = 0
+    for record in records:
+        try:
+            reference.fill_row(X[rows], record)
+        except (TypeError, ValueError):
+            continue
+        rows += 1
+    X = X[:rows]
+    expected = reference.predict_proba(X.copy())
+    actual = candidate.predict_proba(X)
+    return {
+        'rows': rows,
+        'label_agreement': float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))) if rows else None,
+        'max_abs_error': float(np.abs(expected - actual).max()) if rows else None
+    }
+
+# Hyperparameter search space for search_hyperparameters
+DEFAULT_SEARCH_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 8, 16],
+    'max_features': ['sqrt', 'log2', None]
+}
+
+_search_data = None
+
+def _init_search_worker(X, y):
+    # Ship the training arrays once per worker process instead of once per task
+    global _search_data
+    _search_data = (X, y)
+
+def _evaluate_fold(params, train_index, test_index, random_state):
+    from sklearn.ensemble import RandomForestClassifier
+    X, y = _search_data
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    
+    start = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    predictions = model.predict(X[test_index])
+    predict_time = time.perf_counter() - start
+    
+    return float(np.mean(predictions == y[test_index])), fit_time, predict_time
 
 class MedicalTestAnalyzer:
-    def __init__(self):
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, registry=None, cache_size=10000, cache_ttl=None):
+        self.model_path = model_path
+        self.registry = registry or model_registry
+        self.cache = ResultCache(max_size=cache_size, ttl=cache_ttl)
         self.model = None
-        self.scaler = StandardScaler()
+        self.scaler = None
         self.label_encoders = {}
         self.feature_columns = []
         self.target_column = ''
         
+    def prepare_training_data(self, csv_file_path):
+        """Fit encoders and scaler on a CSV and return the encoded (X, y) arrays"""
+        import pandas as pd
+        from sklearn.preprocessing import LabelEncoder, StandardScaler
+        
+        # Fresh preprocessing state, so a published bundle is never mutated later
+        self.scaler = StandardScaler()
+        self.label_encoders = {}
+        
+        # Read CSV file
+        df = pd.read_csv(csv_file_path)
+        print(f"Loaded data with shape: {df.shape}")
+        print(f"Columns: {df.columns.tolist()}")
+        
+        # Identify numeric and categorical columns
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+        
+        print(f"Numeric columns: {numeric_cols}")
+        print(f"Categorical columns: {categorical_cols}")
+        
+        # For simplicity, let's assume the last column is the target (condition to predict)
+        self.target_column = df.columns[-1]
+        self.feature_columns = df.columns[:-1].tolist()
+        
+        # Prepare features
+        X = df[self.feature_columns].copy()
+        y = df[self.target_column].copy()
+        
+        # Handle categorical variables
+        for col in categorical_cols:
+            if col in self.feature_columns:
+                le = LabelEncoder()
+                X[col] = le.fit_transform(X[col].astype(str))
+                self.label_encoders[col] = le
+        
+        # Handle missing values
+        X = X.fillna(X.mean())
+        
+        # Scale numeric features
+        if len(numeric_cols) > 0:
+            X[numeric_cols] = self.scaler.fit_transform(X[numeric_cols])
+        
+        # Encode target variable
+        self.label_encoders['target'] = LabelEncoder()
+        y_encoded = self.label_encoders['target'].fit_transform(y)
+        
+        return X.to_numpy(dtype=np.float64), y_encoded
+    
+    def save_model(self, metadata=None):
+        """Publish the trained model, preprocessing state and optional metadata"""
+        serving_threads(self.model)
+        bundle = {
+            'model': self.model,
+            'scaler': self.scaler,
+            'label_encoders': self.label_encoders,
+            'feature_columns': self.feature_columns,
+            'target_column': self.target_column
+        }
+        if metadata is not None:
+            bundle['metadata'] = metadata
+        return self.registry.publish(self.model_path, bundle)
+    
     def load_data(self, csv_file_path):
         """Load and preprocess medical test data from CSV"""
+        from sklearn.ensemble import RandomForestClassifier
+        try:
+            X, y_encoded = self.prepare_training_data(csv_file_path)
+            
+            # Train model on every core
+            self.model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+            self.model.fit(X, y_encoded)
+            
+            # Save model and make it the current version for this process
+            self.save_model()
+            
+            print("Model trained and saved successfully!")
+            return True
+            
+        except Exception as e:
+            print(f"Error training model: {e}")
+            return False
+    
+    def search_hyperparameters(self, csv_file_path, param_grid=None, cv=5, n_workers=None, random_state=42):
+        """Cross-validated forest search on a process pool; the best model is saved"""
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import KFold, ParameterGrid, StratifiedKFold
+        try:
+            X, y = self.prepare_training_data(csv_file_path)
+            param_grid = param_grid or DEFAULT_SEARCH_GRID
+            candidates = list(ParameterGrid(param_grid))
+            
+            # Stratify when every class has enough rows for the requested folds
+            cv = max(2, min(cv, len(y)))
+            if np.bincount(y).min() >= cv:
+                splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+            else:
+                splitter = KFold(n_splits=cv, shuffle=True, random_state=random_state)
+            folds = list(splitter.split(X, y))
+            
+            print(f"Evaluating {len(candidates)} candidates x {cv} folds")
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_search_worker,
+                                     initargs=(X, y)) as pool:
+                futures = [
+                    [pool.submit(_evaluate_fold, params, train_index, test_index, random_state)
+                     for train_index, test_index in folds]
+                    for params in candidates
+                ]
+                results = []
+                for params, fold_futures in zip(candidates, futures):
+                    scores, fit_times, predict_times = zip(*(future.result() for future in fold_futures))
+                    results.append({
+                        'params': params,
+                        'accuracy': float(np.mean(scores)),
+                        'accuracy_std': float(np.std(scores)),
+                        'fit_time': float(np.mean(fit_times)),
+                        'predict_time': float(np.mean(predict_times))
+                    })
+            
+            for result in sorted(results, key=lambda r: -r['accuracy']):
+                print(f"{result['params']}: accuracy={result['accuracy']:.4f} (+/- {result['accuracy_std']:.4f}) "
+                      f"fit={result['fit_time'] * 1000:.1f}ms predict={result['predict_time'] * 1000:.1f}ms")
+            
+            # Highest accuracy wins; faster fits break ties
+            best = max(results, key=lambda r: (r['accuracy'], -r['fit_time']))
+            print(f"Best parameters: {best['params']}")
+            
+            self.model = RandomForestClassifier(random_state=random_state, n_jobs=-1, **best['params'])
+            self.model.fit(X, y)
+            self.save_model(metadata={
+                'params': best['params'],
+                'cv_folds': cv,
+                'cv_accuracy': best['accuracy'],
+                'candidates': results,
+                'training_rows': len(y),
+                'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            })
+            
+            print("Model trained and saved successfully!")
+            return best
+            
+        except Exception as e:
+            print(f"Error training model: {e}")
+            return None
+    
+    def load_data_chunked(self, csv_file_path, chunksize=100000, sample_size=200000,
+                          incremental=False, random_state=42):
+        """Train from a CSV of any size, keeping peak memory bounded.
+        
+        Scaler and encoder statistics are accumulated chunk by chunk. The model
+        is either a RandomForest fitted on a uniform reservoir sample of at most
+        sample_size rows, or (incremental=True) an SGD classifier trained with
+        partial_fit over a second pass through the file.
+        """
+        import pandas as pd
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import LabelEncoder, StandardScaler
+        
         try:
-            # Read CSV file
-            df = pd.read_csv(csv_file_path)
-            print(f"Loaded data with shape: {df.shape}")
-            print(f"Columns: {df.columns.tolist()}")
+            self.scaler = StandardScaler()
+            self.label_encoders = {}
             
-            # Identify numeric and categorical columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+            # Infer column roles from the head of the file, then read with compact dtypes
+            head = pd.read_csv(csv_file_path, nrows=1000)
+            self.target_column = head.columns[-1]
+            self.feature_columns = head.columns[:-1].tolist()
+            categorical_cols = [col for col in self.feature_columns if not pd.api.types.is_numeric_dtype(head[col])]
+            numeric_cols = [col for col in self.feature_columns if col not in categorical_cols]
+            dtypes = {col: np.float32 for col in numeric_cols}
+            dtypes.update({col: 'category' for col in categorical_cols + [self.target_column]})
             
             print(f"Numeric columns: {numeric_cols}")
             print(f"Categorical columns: {categorical_cols}")
             
-            # For simplicity, let's assume the last column is the target (condition to predict)
-            self.target_column = df.columns[-1]
-            self.feature_columns = df.columns[:-1].tolist()
-            
-            # Prepare features
-            X = df[self.feature_columns].copy()
-            y = df[self.target_column].copy()
+            def read_chunks():
+                for chunk in pd.read_csv(csv_file_path, chunksize=chunksize, dtype=dtypes):
+                    chunk = chunk[chunk[self.target_column].notna()]
+                    yield (
+                        chunk[numeric_cols].to_numpy(dtype=np.float32),
+                        chunk[categorical_cols].astype(str).to_numpy(),
+                        chunk[self.target_column].astype(str).to_numpy()
+                    )
             
-            # Handle categorical variables
-            for col in categorical_cols:
-                if col in self.feature_columns:
-                    le = LabelEncoder()
-                    X[col] = le.fit_transform(X[col].astype(str))
-                    self.label_encoders[col] = le
+            # Pass 1: running statistics plus a reservoir sample (Algorithm R)
+            if incremental:
+                sample_size = 0
+            rng = np.random.default_rng(random_state)
+            categories = [set() for _ in categorical_cols]
+            target_categories = set()
+            sample_numeric = np.empty((sample_size, len(numeric_cols)), dtype=np.float32)
+            sample_categorical = np.empty((sample_size, len(categorical_cols)), dtype=object)
+            sample_target = np.empty(sample_size, dtype=object)
+            seen = 0
             
-            # Handle missing values
-            X = X.fillna(X.mean())
+            for numeric, categorical, target in read_chunks():
+                rows = len(target)
+                if rows == 0:
+                    continue
+                if numeric_cols:
+                    self.scaler.partial_fit(numeric)
+                for index, values in enumerate(categories):
+                    values.update(np.unique(categorical[:, index]))
+                target_categories.update(np.unique(target))
+                
+                if not incremental:
+                    # Fill free slots first, then replace with probability k / (i + 1)
+                    free = max(0, min(sample_size - seen, rows))
+                    slots = np.arange(seen, seen + free)
+                    candidates = np.arange(free)
+                    if free < rows:
+                        draws = rng.integers(0, seen + np.arange(free, rows) + 1)
+                        keep = draws < sample_size
+                        slots = np.concatenate([slots, draws[keep]])
+                        candidates = np.concatenate([candidates, free + np.nonzero(keep)[0]])
+                    sample_numeric[slots] = numeric[candidates]
+                    sample_categorical[slots] = categorical[candidates]
+                    sample_target[slots] = target[candidates]
+                seen += rows
             
-            # Scale numeric features
-            if len(numeric_cols) > 0:
-                X[numeric_cols] = self.scaler.fit_transform(X[numeric_cols])
+            print(f"Streamed {seen} rows in chunks of {chunksize}")
             
-            # Encode target variable
+            for col, values in zip(categorical_cols, categories):
+                self.label_encoders[col] = LabelEncoder()
+                self.label_encoders[col].classes_ = np.array(sorted(values), dtype=object)
             self.label_encoders['target'] = LabelEncoder()
-            y_encoded = self.label_encoders['target'].fit_transform(y)
+            self.label_encoders['target'].classes_ = np.array(sorted(target_categories), dtype=object)
             
-            # Train model
-            self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-            self.model.fit(X, y_encoded)
+            def encode(numeric, categorical):
+                X = np.empty((len(numeric), len(self.feature_columns)))
+                for index, col in enumerate(numeric_cols):
+                    values = numeric[:, index].astype(np.float64)
+                    # Same mean fill as load_data, then standard scaling
+                    values[np.isnan(values)] = self.scaler.mean_[index]
+                    X[:, self.feature_columns.index(col)] = (values - self.scaler.mean_[index]) / self.scaler.scale_[index]
+                for index, col in enumerate(categorical_cols):
+                    X[:, self.feature_columns.index(col)] = np.searchsorted(
+                        self.label_encoders[col].classes_, categorical[:, index])
+                return X
+            
+            classes = np.arange(len(self.label_encoders['target'].classes_))
+            if incremental:
+                # Pass 2: stream encoded chunks into an incrementally trainable model
+                self.model = SGDClassifier(loss='log_loss', random_state=random_state)
+                for numeric, categorical, target in read_chunks():
+                    if len(target):
+                        y = np.searchsorted(self.label_encoders['target'].classes_, target)
+                        self.model.partial_fit(encode(numeric, categorical), y, classes=classes)
+            else:
+                kept = min(seen, sample_size)
+                X = encode(sample_numeric[:kept], sample_categorical[:kept])
+                y = np.searchsorted(self.label_encoders['target'].classes_, sample_target[:kept].astype(str))
+                print(f"Training on a reservoir sample of {kept} rows")
+                self.model = RandomForestClassifier(n_estimators=100, random_state=random_state)
+                self.model.fit(X, y)
             
-            # Save model
-            joblib.dump({
-                'model': self.model,
-                'scaler': self.scaler,
-                'label_encoders': self.label_encoders,
-                'feature_columns': self.feature_columns,
-                'target_column': self.target_column
-            }, 'medical_model.pkl')
+            self.save_model()
             
             print("Model trained and saved successfully!")
             return True
@@ -75,54 +617,161 @@ class MedicalTestAnalyzer:
             print(f"Error training model: {e}")
             return False
     
+    def update_from_records(self, records, labels, watermark, load_window=None, new_trees=20,
+                            max_trees=500, holdout=0.2, min_rows=50, tolerance=0.01):
+        """Grow or refit the current forest on newly labelled records; publish it if it validates.
+        
+        records and labels are in arrival order, and the newest holdout
+        fraction is kept back for validation. When every label is already
+        known and the forest has room, new_trees trees are added with
+        warm_start, so the cost follows the number of new rows. Otherwise
+        the forest is refit on load_window(), a bounded (records, labels)
+        slice of recent history. The candidate is published with watermark
+        in its metadata only if its holdout accuracy is within tolerance of
+        the current model's. Labels the current model has never seen reject
+        the update outright rather than growing its vocabulary. Results for
+        examined batches, published or rejected, carry watermark so the
+        caller can move past them; skipped batches don't.
+        """
+        from sklearn.ensemble import RandomForestClassifier
+        
+        bundle = self.registry.get(self.model_path)
+        if bundle is None:
+            return {'published': False, 'reason': 'no model to update'}
+        current = bundle['model']
+        if not hasattr(current, 'fit'):
+            return {'published': False, 'reason': 'compact models are read-only; update the pickled model and export it again'}
+        if len(records) < min_rows:
+            return {'published': False, 'reason': f"{len(records)} new rows, need {min_rows}"}
+        
+        metadata = dict(bundle.get('metadata') or {})
+        target = bundle['label_encoders']['target']
+        # Labels outside the published model's vocabulary come from a different labelling
+        # scheme, so neither accuracy would mean anything; such a model is never replaced
+        vocabulary = set(target.classes_)
+        if not set(labels) <= vocabulary:
+            return {'published': False, 'watermark': watermark,
+                    'reason': f"labels outside the model's vocabulary: {sorted(set(labels) - vocabulary)}"}
+        trees = len(getattr(current, 'estimators_', ()))
+        base_trees = metadata.get('base_trees') or trees or 100
+        # warm_start can't add classes, so every new label must be one the forest already predicts
+        predictable = set(target.classes_[current.classes_.astype(np.intp)]) if trees else set()
+        mode = 'warm_start'
+        if not trees or trees + new_trees > max_trees or not set(labels) <= predictable:
+            if load_window is None:
+                return {'published': False, 'reason': 'the forest needs a refit but no window was given'}
+            mode = 'window'
+            records, labels = load_window()
+            if not set(labels) <= vocabulary:
+                return {'published': False, 'watermark': watermark,
+                        'reason': f"labels outside the model's vocabulary: {sorted(set(labels) - vocabulary)}"}
+        
+        X, positions = bundle['pipeline'].encode(records)
+        labels = np.array(labels, dtype=object)[positions]
+        split = len(labels) - max(1, int(len(labels) * holdout))
+        if split < 1:
+            return {'published': False, 'reason': 'too few rows to hold out a validation slice'}
+        
+        classes = target.classes_
+        y = np.searchsorted(classes, labels)
+        X_train, y_train = X[:split], y[:split]
+        
+        if mode == 'warm_start':
+            # Shallow copy: serving threads keep the published forest while new trees are appended
+            model = copy.copy(current)
+            model.estimators_ = list(current.estimators_)
+            model.set_params(warm_start=True, n_estimators=trees + new_trees, n_jobs=-1)
+            # Every class must appear in y, or the new trees' outputs won't line
+            # up with the old ones; zero-weight rows stand in for missing classes
+            missing = np.setdiff1d(current.classes_, y_train)
+            weights = np.ones(len(y_train) + len(missing))
+            weights[len(y_train):] = 0
+            X_train = np.vstack([X_train, np.zeros((len(missing), X.shape[1]))])
+            y_train = np.concatenate([y_train, missing.astype(y_train.dtype)])
+            model.fit(X_train, y_train, sample_weight=weights)
+            model.set_params(warm_start=False)
+        else:
+            params = current.get_params() if trees else {'random_state': 42, 'n_jobs': -1}
+            # Published models serve with n_jobs=None; training still uses every core
+            params.update(n_estimators=base_trees, warm_start=False, n_jobs=-1)
+            model = RandomForestClassifier(**params)
+            model.fit(X_train, y_train)
+        
+        def holdout_accuracy(forest, forest_classes):
+            with warnings.catch_warnings():
+                # Forests fitted on a DataFrame warn on every array input
+                warnings.simplefilter('ignore', UserWarning)
+                best = forest.predict_proba(X[split:]).argmax(axis=1)
+            predicted = forest_classes[forest.classes_.astype(np.intp)][best]
+            return float(np.mean(predicted == labels[split:]))
+        
+        result = {
+            'mode': mode,
+            'watermark': watermark,
+            'rows': split,
+            'holdout_rows': len(labels) - split,
+            'trees': len(model.estimators_),
+            'baseline_accuracy': holdout_accuracy(current, target.classes_),
+            'holdout_accuracy': holdout_accuracy(model, classes)
+        }
+        if result['holdout_accuracy'] < result['baseline_accuracy'] - tolerance:
+            result.update(published=False, reason='holdout accuracy dropped')
+            return result
+        
+        from sklearn.preprocessing import LabelEncoder
+        self.model = model
+        self.scaler = bundle['scaler']
+        self.label_encoders = dict(bundle['label_encoders'])
+        self.label_encoders['target'] = LabelEncoder()
+        self.label_encoders['target'].classes_ = classes
+        self.feature_columns = bundle['feature_columns']
+        self.target_column = bundle.get('target_column', '')
+        metadata.update({
+            'watermark': watermark,
+            'base_trees': base_trees,
+            'update_mode': mode,
+            'updated_at': time.time(),
+            'holdout_accuracy': result['holdout_accuracy']
+        })
+        result.update(published=True, version=self.save_model(metadata))
+        return result
+    
     def predict(self, test_data):
         """Predict condition based on test results"""
         try:
-            if self.model is None:
-                # Try to load saved model
-                if os.path.exists('medical_model.pkl'):
-                    model_data = joblib.load('medical_model.pkl')
-                    self.model = model_data['model']
-                    self.scaler = model_data['scaler']
-                    self.label_encoders = model_data['label_encoders']
-                    self.feature_columns = model_data['feature_columns']
-                    self.target_column = model_data['target_column']
-                else:
-                    return "Model not trained", 0.0
-            
-            # Prepare input data
-            input_df = pd.DataFrame([test_data])
-            
-            # Encode categorical variables
-            for col in self.feature_columns:
-                if col in self.label_encoders:
-                    if test_data[col] in self.label_encoders[col].classes_:
-                        input_df[col] = self.label_encoders[col].transform([test_data[col]])[0]
-                    else:
-                        input_df[col] = 0  # Default value for unknown categories
-                else:
-                    # Handle numeric columns
-                    input_df[col] = float(test_data[col])
-            
-            # Scale features
-            numeric_cols = input_df.select_dtypes(include=[np.number]).columns
-            if len(numeric_cols) > 0:
-                input_df[numeric_cols] = self.scaler.transform(input_df[numeric_cols])
+            # Always read from the registry so retrained models are picked up
+            bundle = self.registry.get(self.model_path)
+            if bundle is None:
+                return "Model not trained", 0.0
             
-            # Make prediction
-            prediction = self.model.predict(input_df[self.feature_columns])[0]
-            probability = np.max(self.model.predict_proba(input_df[self.feature_columns]))
+            # Single predict_proba call on a preallocated row; argmax gives the class
+            return bundle['pipeline'].predict_one(test_data)
             
-            # Decode prediction
-            condition = self.label_encoders['target'].inverse_transform([prediction])[0]
+        except Exception as e:
+            return f"Prediction error: {str(e)}", 0.0
+    
+    def predict_many(self, records):
+        """Predict conditions for many records with one forest call"""
+        try:
+            bundle = self.registry.get(self.model_path)
+            if bundle is None:
+                return [("Model not trained", 0.0)] * len(records)
             
-            return condition, round(probability * 100, 2)
+            return bundle['pipeline'].predict_many(records)
             
         except Exception as e:
-            return f"Prediction error: {str(e)}", 0.0
+            return [(f"Prediction error: {str(e)}", 0.0)] * len(records)
     
     def analyze_medical_report(self, test_results):
-        """Comprehensive analysis of medical report"""
+        """Comprehensive analysis of medical report, memoized per model version"""
+        key = content_key(test_results, self.registry.version(self.model_path))
+        result = self.cache.get(key)
+        if result is None:
+            result = self.evaluate_medical_report(test_results)
+            self.cache.set(key, result)
+        return dict(result)
+    
+    def evaluate_medical_report(self, test_results):
         try:
             # Predict condition
             condition, confidence = self.predict(test_results)
@@ -205,4 +854,43 @@ class MedicalTestAnalyzer:
                     except ValueError:
                         continue
         
-        return ', '.join(abnormal_findings) if abnormal_findings else 'No significant abnormalities detected'
\ No newline at end of file
+        return ', '.join(abnormal_findings) if abnormal_findings else 'No significant abnormalities detected'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the medical condition model')
+    parser.add_argument('csv_file', help='CSV of test results; the last column is the target')
+    parser.add_argument('--model-path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--search', action='store_true', help='run a cross-validated hyperparameter search')
+    parser.add_argument('--cv', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None, help='search processes (default: all cores)')
+    parser.add_argument('--chunked', action='store_true', help='stream the CSV for bounded-memory training')
+    parser.add_argument('--incremental', action='store_true', help='with --chunked, train an SGD model via partial_fit')
+    parser.add_argument('--export-compact', metavar='DIR', help='also export the forest as memory-mappable arrays')
+    parser.add_argument('--export-only', action='store_true', help='export the existing model at --model-path without training')
+    parser.add_argument('--precision', choices=('float32', 'float64'), default='float32', help='threshold precision')
+    parser.add_argument('--quantize', type=int, choices=(8, 16), help='store leaf probabilities in 8 or 16 bits')
+    args = parser.parse_args()
+    
+    trainer = MedicalTestAnalyzer(args.model_path)
+    if args.export_only:
+        ok = True
+    elif args.search:
+        ok = trainer.search_hyperparameters(args.csv_file, cv=args.cv, n_workers=args.workers) is not None
+    elif args.chunked:
+        ok = trainer.load_data_chunked(args.csv_file, incremental=args.incremental)
+    else:
+        ok = trainer.load_data(args.csv_file)
+    
+    if ok and args.export_compact:
+        import csv
+        bundle = model_registry.get(args.model_path)
+        forest = export_compact(bundle, args.export_compact, dtype=np.dtype(args.precision), quantize=args.quantize)
+        print(f"Exported {len(forest.roots)} trees to {args.export_compact} ({forest.nbytes / 1024:.0f} KiB)")
+        # Check the export against the original model on the training rows
+        with open(args.csv_file, newline='') as f:
+            records = list(csv.DictReader(f))
+        compact = load_compact(args.export_compact)
+        report = compare_pipelines(bundle['pipeline'], FeaturePipeline(compact), records)
+        print(f"Verified on {report['rows']} rows: label agreement {report['label_agreement']}, "
+              f"max probability error {report['max_abs_error']}")
+    raise SystemExit(0 if ok else 1)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import bisect
+import threading
+from array import array
+
+import numpy as np
+
+ALL_BAND = 'all'
+
+def population_band(age, gender, width=10):
+    """Age decade plus gender, e.g. '40-49|female'; None when either is unknown"""
+    if age is None or not gender:
+        return None
+    try:
+        low = int(age) // width * width
+    except (TypeError, ValueError):
+        # Profile forms send '' for an age left blank
+        return None
+    return f"{low}-{low + width - 1}|{gender.strip().lower()}"
+
+class PercentileIndex:
+    """In-memory sorted value arrays per (analyte, band), queried with searchsorted.
+
+    New values land in a small sorted buffer that is merged into the main
+    array once it exceeds merge_threshold, so inserts stay cheap and a
+    lookup is two binary searches. Bands use the user's current age and
+    gender; profile changes take effect on the next rebuild.
+    """
+    def __init__(self, merge_threshold=1024, min_band_size=30):
+        self.merge_threshold = merge_threshold
+        self.min_band_size = min_band_size
+        self._values = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def build(self, rows):
+        """Rebuild from (analyte, value, age, gender) rows and swap the index in"""
+        collected = {}
+        for analyte, value, age, gender in rows:
+            for key in self._keys(analyte, age, gender):
+                collected.setdefault(key, array('d')).append(value)
+        values = {key: np.sort(np.frombuffer(column, dtype=np.float64)) for key, column in collected.items()}
+        with self._lock:
+            self._values = values
+            self._pending = {}
+        return sum(len(column) for key, column in values.items() if key[1] == ALL_BAND)
+
+    def add(self, analyte, value, age=None, gender=None):
+        with self._lock:
+            for key in self._keys(analyte, age, gender):
+                pending = self._pending.setdefault(key, [])
+                bisect.insort(pending, value)
+                if len(pending) > self.merge_threshold:
+                    merged = np.concatenate([self._values.get(key, np.empty(0)), pending])
+                    merged.sort(kind='mergesort')
+                    self._values[key] = merged
+                    self._pending[key] = []
+
+    def percentile(self, analyte, value, age=None, gender=None):
+        """Percentile of value among stored results, within the band when it is large enough"""
+        band = population_band(age, gender)
+        with self._lock:
+            if band is not None:
+                result = self._rank((analyte, band), value)
+                if result is not None and result[2] >= self.min_band_size:
+                    return self._format(result, band)
+            result = self._rank((analyte, ALL_BAND), value)
+        return self._format(result, ALL_BAND) if result is not None else None
+
+    def stats(self):
+        with self._lock:
+            analytes = {key[0] for key in self._values} | {key[0] for key in self._pending}
+            total = sum(len(column) for key, column in self._values.items() if key[1] == ALL_BAND)
+            total += sum(len(column) for key, column in self._pending.items() if key[1] == ALL_BAND)
+        return {'analytes': len(analytes), 'values': total}
+
+    def _keys(self, analyte, age, gender):
+        band = population_band(age, gender)
+        return ((analyte, ALL_BAND),) if band is None else ((analyte, ALL_BAND), (analyte, band))
+
+    def _rank(self, key, value):
+        column = self._values.get(key)
+        pending = self._pending.get(key, ())
+        size = (len(column) if column is not None else 0) + len(pending)
+        if size == 0:
+            return None
+        below = bisect.bisect_left(pending, value)
+        at_or_below = bisect.bisect_right(pending, value)
+        if column is not None:
+            below += int(np.searchsorted(column, value, side='left'))
+            at_or_below += int(np.searchsorted(column, value, side='right'))
+        return below, at_or_below, size
+
+    def _format(self, result, band):
+        below, at_or_below, size = result
+        # Ties count half, so the median of identical values is the 50th percentile
+        return {
+            'percentile': round(100.0 * (below + at_or_below) / (2 * size), 1),
+            'band': band,
+            'sample_size': size
+        }
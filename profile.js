@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Load profile data
     loadProfileData();
+    loadSummary();
     loadRecentReports();
     
     // Profile form submission
@@ -74,20 +75,35 @@ async function loadProfileData() {
     }
 }
 
+async function loadSummary() {
+    try {
+        const response = await fetch(`${API_BASE}/dashboard-summary`, {
+            credentials: 'include'
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            document.getElementById('totalReports').textContent = data.summary.report_count;
+        }
+    } catch (error) {
+        console.error('Error loading summary:', error);
+    }
+}
+
 async function loadRecentReports() {
     try {
-        const response = await fetch(`${API_BASE}/report-history`, {
+        const response = await fetch(`${API_BASE}/report-history?limit=5`, {
             credentials: 'include'
         });
         
         const data = await response.json();
         
         const recentReports = document.getElementById('recentReports');
-        document.getElementById('totalReports').textContent = data.reports ? data.reports.length : 0;
         
         if (data.success && data.reports.length > 0) {
-            // Show only last 5 reports
-            const recent = data.reports.slice(0, 5);
+            // The server already returns only the last 5 reports
+            const recent = data.reports;
             
             recentReports.innerHTML = recent.map(report => `
                 <div class="history-item">
@@ -0,0 +1,61 @@
+import gzip
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def dumps(value):
+    """Compact JSON text, encoded with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=ORJSON_OPTIONS).decode()
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+class RawJSON(str):
+    """Text that is already valid JSON; encode() splices it in verbatim"""
+
+def encode(value):
+    """JSON text for value, with RawJSON dict values and list items spliced in unparsed"""
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{dumps(str(key))}:{encode(item)}' for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(encode(item) for item in value) + ']'
+    return dumps(value)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    Output matches the default provider: keys are sorted when sort_keys is
+    set and datetimes still go through the default HTTP date conversion.
+    Calls with extra json.dumps arguments (indent in debug mode) fall back
+    to the standard library.
+    """
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact, so the default separators need no handling
+        if orjson is None or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+def gzip_response(response, level=6):
+    """Replace response's body with its gzip encoding and adjust the headers.
+
+    The ETag becomes weak: the compressed bytes differ from the identity
+    representation, but both carry the same content.
+    """
+    response.set_data(gzip.compress(response.get_data(), compresslevel=level))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response